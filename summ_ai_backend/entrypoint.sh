@@ -1,20 +1,68 @@
 #!/bin/sh
-echo "Making initial migrations for the translation app..."
-python manage.py makemigrations translation --noinput
-echo "Done."
-echo "Making init. migrations ... "
-python manage.py makemigrations --noinput
-echo "done"
-echo "Migrate ... "
-python manage.py migrate --noinput
-echo "done"
-echo "Collectstatics ... "
-python manage.py collectstatic --noinput
-echo "done"
-echo "Creating admin user ... "
-if [ "$DJANGO_SUPERUSER_USERNAME" ]; then
-    echo "Creating superuser..."
-    python manage.py shell -c "
+# RUN_MODE=production skips the migration, static files and admin user steps when their
+# inputs are unchanged since they last succeeded, and serves with one worker per CPU
+# (see gunicorn.conf.py). Any other RUN_MODE runs every step and the auto-reloading
+# development server.
+set -e
+RUN_MODE="${RUN_MODE:-development}"
+STATE_DIR="${STATE_DIR:-.deploy_state}"
+mkdir -p "$STATE_DIR"
+
+# Prints a hash of the names and contents of the files in the given paths
+fingerprint() {
+    {
+        echo "$@"
+        find "$@" -type f ! -name '*.pyc' -print0 2>/dev/null | LC_ALL=C sort -z | xargs -0 -r sha256sum
+    } | sha256sum | cut -d' ' -f1
+}
+
+# Succeeds in production mode if step $1 last succeeded with fingerprint $2
+is_current() {
+    [ "$RUN_MODE" = "production" ] && [ "$(cat "$STATE_DIR/$1" 2>/dev/null)" = "$2" ]
+}
+
+# Records that step $1 succeeded with fingerprint $2
+record() {
+    echo "$2" > "$STATE_DIR/$1"
+}
+
+MIGRATION_INPUTS="translation/models.py translation/search.py translation/migrations summ_ai_backend/settings.py requirements.txt"
+STATIC_INPUTS="translation/static translation/templates summ_ai_backend/settings.py requirements.txt"
+
+if [ -f db.sqlite3 ] && is_current migrations "$(fingerprint $MIGRATION_INPUTS)"; then
+    echo "Migrations unchanged, skipped."
+else
+    echo "Making initial migrations for the translation app..."
+    python manage.py makemigrations translation --noinput
+    echo "Done."
+    echo "Making init. migrations ... "
+    python manage.py makemigrations --noinput
+    echo "done"
+    echo "Migrate ... "
+    python manage.py migrate --noinput
+    echo "done"
+    # Taken after makemigrations, which may have added migration files
+    record migrations "$(fingerprint $MIGRATION_INPUTS)"
+fi
+
+if [ -f staticfiles/staticfiles.json ] && is_current static "$(fingerprint $STATIC_INPUTS)"; then
+    echo "Static files unchanged, skipped."
+else
+    echo "Collectstatics ... "
+    python manage.py collectstatic --noinput
+    echo "done"
+    record static "$(fingerprint $STATIC_INPUTS)"
+fi
+
+# The admin user is created again if the database was migrated since
+SUPERUSER_FINGERPRINT="$(echo "$DJANGO_SUPERUSER_USERNAME $(cat "$STATE_DIR/migrations")" | sha256sum | cut -d' ' -f1)"
+if is_current superuser "$SUPERUSER_FINGERPRINT"; then
+    echo "Admin user unchanged, skipped."
+else
+    echo "Creating admin user ... "
+    if [ "$DJANGO_SUPERUSER_USERNAME" ]; then
+        echo "Creating superuser..."
+        python manage.py shell -c "
 from django.contrib.auth.models import User
 
 username = '$DJANGO_SUPERUSER_USERNAME'
@@ -27,6 +75,17 @@ if not User.objects.filter(username=username).exists():
 else:
     print(f'Superuser {username} already exists')
 "
+    fi
+    echo "done"
+    record superuser "$SUPERUSER_FINGERPRINT"
+fi
+
+if [ "$RUN_MODE" = "production" ]; then
+    # Every worker writes its metrics here and /metrics reports their sum; start from zero
+    export METRICS_DIR="${METRICS_DIR:-/tmp/summ_ai_backend_metrics}"
+    rm -rf "$METRICS_DIR"
+    # exec, so SIGHUP (graceful reload) and SIGTERM (graceful stop) reach gunicorn
+    exec gunicorn summ_ai_backend.asgi:application -c gunicorn.conf.py
+else
+    exec uvicorn summ_ai_backend.asgi:application --host 0.0.0.0 --port "${PORT:-80}" --reload
 fi
-echo "done"
-uvicorn summ_ai_backend.asgi:application --host 0.0.0.0 --port 80 --reload
@@ -0,0 +1,24 @@
+"""
+Gunicorn configuration of the production run mode (RUN_MODE=production in entrypoint.sh).
+
+Runs uvicorn workers, one per CPU unless WEB_CONCURRENCY is set. Send SIGHUP to the
+master to replace the workers gracefully, e.g. after a code change; SIGTERM stops the
+server after the requests in flight have finished.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '80')}"
+worker_class = 'uvicorn.workers.UvicornWorker'
+# CPUs this container may run on, rather than all CPUs of the host
+workers = int(os.environ.get('WEB_CONCURRENCY') or len(os.sched_getaffinity(0)))
+
+# Translating a long document waits on many upstream calls
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+# Time the requests in flight get to finish on reload or shutdown
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', '60'))
+# Replace workers after this many requests, staggered so they do not restart together
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '5000'))
+max_requests_jitter = max_requests // 10
+keepalive = 5
+
+accesslog = '-'
@@ -56,6 +56,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'translation.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -162,4 +163,45 @@ STORAGES = {
     "staticfiles": {
         "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
     },
-}
\ No newline at end of file
+}
+# List endpoints stream their JSON body once a result exceeds this many rows,
+# fetching FAST_LIST_CHUNK_SIZE rows per database query.
+FAST_LIST_STREAM_THRESHOLD = 1000
+FAST_LIST_CHUNK_SIZE = 2000
+
+# Number of rows fetched per database query by the streaming translation export
+EXPORT_CHUNK_SIZE = 2000
+
+# Default and maximum page size of the translation search endpoint
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
+# Maximum upstream translation requests per second of the bulk pre-translation pool (0 = unlimited)
+UPSTREAM_RATE_LIMIT = float(os.environ.get('UPSTREAM_RATE_LIMIT', '0'))
+
+# Base URL of the translation upstream. Unset uses the DeepL API; point it at
+# `python manage.py fake_upstream` (e.g. http://127.0.0.1:8001) to measure the
+# service without spending DeepL quota.
+DEEPL_SERVER_URL = os.environ.get('DEEPL_SERVER_URL') or None
+
+# Directory where every worker process writes its translation metrics, so /metrics
+# reports the sum over all uvicorn workers. Unset keeps metrics per process.
+# Clear it when the server is (re)deployed.
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+
+# Bearer token required to read /metrics; unset leaves the endpoint open
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+
+# Request profiling: PROFILING_SAMPLE_RATE is the fraction of requests profiled (0 = only
+# requests from admin users sending 'X-Profile: 1'). Profiles are sampled every
+# PROFILING_INTERVAL_MS and the newest PROFILING_MAX_PROFILES are kept in PROFILING_DIR.
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_INTERVAL_MS = 5
+PROFILING_MAX_PROFILES = int(os.environ.get('PROFILING_MAX_PROFILES', '100'))
+PROFILING_DIR = os.environ.get('PROFILING_DIR') or os.path.join(BASE_DIR, 'profiles')
+
+# Segments left untranslated by an upstream failure are retried in the background after
+# SEGMENT_RETRY_DELAY seconds, doubling the delay up to SEGMENT_RETRY_MAX_ATTEMPTS times
+# (0 disables background retries; `python manage.py retry_failed_segments` retries the rest).
+SEGMENT_RETRY_DELAY = float(os.environ.get('SEGMENT_RETRY_DELAY', '30'))
+SEGMENT_RETRY_MAX_ATTEMPTS = 5
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.urls import path, include
-from translation.views import RegisterView, UserDetailView, TranslationCreateView, TranslationListView, AdminUserListView, AdminTranslationListView, AdminTranslationListView
+from translation.views import RegisterView, UserDetailView, TranslationCreateView, TranslationListView, AdminUserListView, AdminTranslationListView, AdminTranslationListView, AdminTranslationExportView, TranslationSearchView, AdminUsageView, AdminProfileListView, AdminProfileDetailView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from django.conf.urls.static import static
 from django.conf import settings
@@ -15,8 +15,13 @@ urlpatterns = [
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/user/', UserDetailView.as_view(), name='user-detail'),
     path('api/translate/', TranslationCreateView.as_view(), name='translation-create'),
+    path('api/translations/search/', TranslationSearchView.as_view(), name='translation-search'),
     path('api/translations/', TranslationListView.as_view(), name='translation-list'),
     path('api/admin/translations/<int:user_id>/', AdminTranslationListView.as_view(), name='admin-translation-list'),
+    path('api/admin/export/translations/', AdminTranslationExportView.as_view(), name='admin-translation-export'),
+    path('api/admin/usage/', AdminUsageView.as_view(), name='admin-usage'),
+    path('api/admin/profiles/', AdminProfileListView.as_view(), name='admin-profile-list'),
+    path('api/admin/profiles/<slug:profile_id>/', AdminProfileDetailView.as_view(), name='admin-profile-detail'),
     path('api/admin/users/', AdminUserListView.as_view(), name='admin-user-list'),
     path('', include('translation.urls')),
 ]
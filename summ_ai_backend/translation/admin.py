@@ -1,4 +1,5 @@
 from django.contrib import admin
-from .models import Translation
+from .models import Translation, UsageCounter
 
-admin.site.register(Translation)
\ No newline at end of file
+admin.site.register(Translation)
+admin.site.register(UsageCounter)
\ No newline at end of file
@@ -1,7 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class TranslationConfig(AppConfig):
     # Sets the default primary key field type for models in this app
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'translation'
+
+    def ready(self):
+        # Create the full-text search index once the translation table exists
+        from .search import create_search_index
+        post_migrate.connect(create_search_index, sender=self)
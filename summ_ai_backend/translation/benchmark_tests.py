@@ -0,0 +1,189 @@
+"""
+Microbenchmarks and regression gates for the CPU-bound helpers in translation/utils.py.
+
+They are skipped unless BENCHMARK=1 is set:
+
+    BENCHMARK=1 pytest translation/benchmark_tests.py -s
+
+Each benchmark reports the best time per call, the peak memory allocated per call and
+the number of memory blocks the call leaves allocated (its result and anything it
+caches), and fails when it is slower than its stored baseline by more than BENCHMARK_THRESHOLD
+(default 1.3, i.e. 30%). Baselines are machine-specific; record them again with
+BENCHMARK_UPDATE=1 after an intended change or on a new machine.
+"""
+import functools
+import gc
+import json
+import os
+import time
+import tracemalloc
+from pathlib import Path
+
+import pytest
+from bs4 import BeautifulSoup
+from unittest.mock import patch
+
+from translation.utils import (
+    chunk_text_by_tokens, extract_text_nodes, normalize_html, replace_text_nodes, translate_html, translate_text,
+)
+from translation.workloads import flat_html, make_rng, nested_html, plain_text
+
+BASELINES_PATH = Path(__file__).with_name('benchmark_baselines.json')
+THRESHOLD = float(os.environ.get('BENCHMARK_THRESHOLD', '1.3'))
+UPDATE_BASELINES = os.environ.get('BENCHMARK_UPDATE') == '1'
+
+pytestmark = [
+    pytest.mark.benchmark,
+    pytest.mark.skipif(os.environ.get('BENCHMARK') != '1', reason='Set BENCHMARK=1 to run the microbenchmarks.'),
+]
+
+
+@functools.cache
+def corpus(name):
+    """Returns the generated benchmark document `name`, identical on every run."""
+    rng = make_rng(0)
+    documents = {
+        'plain_small': lambda: plain_text(rng, 50),
+        'plain_medium': lambda: plain_text(rng, 2000),
+        'plain_huge': lambda: plain_text(rng, 200000),
+        'html_flat': lambda: flat_html(rng, paragraphs=300),
+        'html_nested': lambda: nested_html(rng, depth=9, breadth=2),
+    }
+    return documents[name]()
+
+
+def fake_translate_chunk(chunk, dest_language='EN-US'):
+    """Stand-in for the upstream call, so only the local processing is measured."""
+    return chunk
+
+
+def measure(func, setup=None, min_time=0.2, repeat=5):
+    """
+    Measures the best time per call of `func` and the memory it allocates.
+
+    tracemalloc cannot count the blocks a call allocates and frees again, so the peak
+    traced memory stands in for the total allocated, and `blocks` counts the blocks
+    still allocated when the call returns.
+
+    Args:
+        func (callable): The function to benchmark.
+        setup (callable): Returns the arguments of each call; not included in the timing.
+        min_time (float): Minimum duration of one timing round, in seconds.
+        repeat (int): The number of timing rounds; the fastest is kept.
+
+    Returns:
+        dict: 'seconds_per_call', 'peak_kib' (peak memory allocated by one call) and
+        'blocks' (memory blocks allocated by one call and still alive after it).
+    """
+    def timed_calls(count):
+        total = 0.0
+        for _ in range(count):
+            args = setup() if setup else ()
+            start = time.perf_counter()
+            func(*args)
+            total += time.perf_counter() - start
+        return total
+
+    count = 1
+    while timed_calls(count) < min_time / 10 and count < 1_000_000:
+        count *= 10
+    count = max(1, int(count * min_time / max(timed_calls(count), 1e-9)))
+    best = min(timed_calls(count) / count for _ in range(repeat))
+
+    args = setup() if setup else ()
+    # The snapshots themselves are allocated while tracing
+    ignore_tracemalloc = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    tracemalloc.start()
+    try:
+        gc.collect()
+        before_snapshot = tracemalloc.take_snapshot().filter_traces(ignore_tracemalloc)
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        result = func(*args)
+        peak = tracemalloc.get_traced_memory()[1] - before
+        # Documents are reference cycles; only count what the call keeps alive
+        gc.collect()
+        after_snapshot = tracemalloc.take_snapshot().filter_traces(ignore_tracemalloc)
+    finally:
+        tracemalloc.stop()
+    del result
+    blocks = sum(stat.count_diff for stat in after_snapshot.compare_to(before_snapshot, 'filename'))
+    return {'seconds_per_call': best, 'peak_kib': round(peak / 1024, 1), 'blocks': blocks}
+
+
+def check_baseline(name, result):
+    """
+    Reports a benchmark result and compares it to its stored baseline.
+
+    With BENCHMARK_UPDATE=1 the result is stored as the new baseline instead.
+    """
+    baselines = json.loads(BASELINES_PATH.read_text()) if BASELINES_PATH.exists() else {}
+    baseline = baselines.get(name)
+    ratio = result['seconds_per_call'] / baseline['seconds_per_call'] if baseline else None
+    print(
+        f"\n{name:<32} {result['seconds_per_call'] * 1e6:12.1f} us/call {result['peak_kib']:10.1f} KiB/call"
+        f" {result['blocks']:8d} blocks/call"
+        + (f"   {ratio:.2f}x baseline" if ratio else "   no baseline")
+    )
+
+    if UPDATE_BASELINES:
+        baselines[name] = {key: result[key] for key in ('seconds_per_call', 'peak_kib', 'blocks')}
+        BASELINES_PATH.write_text(json.dumps(baselines, indent=2, sort_keys=True) + '\n')
+    elif baseline:
+        assert ratio <= THRESHOLD, (
+            f"{name} regressed: {result['seconds_per_call'] * 1e6:.1f} us/call is {ratio:.2f}x "
+            f"the baseline of {baseline['seconds_per_call'] * 1e6:.1f} us/call"
+        )
+
+
+@pytest.mark.parametrize('document', ['plain_small', 'plain_medium', 'plain_huge'])
+def test_chunk_text_by_tokens(document):
+    """Benchmark splitting plain text into 200-token chunks."""
+    text = corpus(document)
+    check_baseline(f'chunk_text_by_tokens[{document}]', measure(lambda: chunk_text_by_tokens(text)))
+
+
+@pytest.mark.parametrize('document', ['html_flat', 'html_nested'])
+def test_extract_text_nodes(document):
+    """Benchmark collecting the translatable text nodes of a parsed document."""
+    soup = BeautifulSoup(corpus(document), 'html.parser')
+    check_baseline(f'extract_text_nodes[{document}]', measure(lambda: extract_text_nodes(soup)))
+
+
+@pytest.mark.parametrize('document', ['html_flat', 'html_nested'])
+def test_replace_text_nodes(document):
+    """Benchmark the replace_with loop; every call gets a freshly parsed document."""
+    html = corpus(document)
+
+    def setup():
+        text_nodes = extract_text_nodes(BeautifulSoup(html, 'html.parser'))
+        return text_nodes, [str(node) for node in text_nodes]
+
+    check_baseline(f'replace_text_nodes[{document}]', measure(replace_text_nodes, setup=setup))
+
+
+@pytest.mark.parametrize('document', ['html_flat', 'html_nested'])
+def test_normalize_html(document):
+    """Benchmark the final string normalization of a translated document."""
+    with patch('translation.utils.translate_chunk', fake_translate_chunk):
+        soup = BeautifulSoup(corpus(document), 'html.parser')
+        text_nodes = extract_text_nodes(soup)
+        replace_text_nodes(text_nodes, [str(node) for node in text_nodes])
+    html = str(soup)
+    check_baseline(f'normalize_html[{document}]', measure(lambda: normalize_html(html)))
+
+
+@pytest.mark.parametrize('document', ['plain_medium', 'plain_huge'])
+def test_translate_text(document):
+    """Benchmark translate_text end to end with a fake upstream."""
+    text = corpus(document)
+    with patch('translation.utils.translate_chunk', fake_translate_chunk):
+        check_baseline(f'translate_text[{document}]', measure(lambda: translate_text(text)))
+
+
+@pytest.mark.parametrize('document', ['html_flat', 'html_nested'])
+def test_translate_html(document):
+    """Benchmark translate_html end to end with a fake upstream."""
+    html = corpus(document)
+    with patch('translation.utils.translate_chunk', fake_translate_chunk):
+        check_baseline(f'translate_html[{document}]', measure(lambda: translate_html(html)))
@@ -0,0 +1,21 @@
+import time
+
+
+class Rollback(Exception):
+    """Raised to discard the benchmark rows once the measurements are done."""
+
+
+def best_of(func, repeat):
+    """
+    Runs `func` `repeat` times.
+
+    Returns:
+        tuple: The fastest wall-clock time and the result of the last run.
+    """
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
@@ -0,0 +1,136 @@
+import csv
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Translation
+from .serializers import TranslationValuesSerializer
+from .streaming import encode_json, iter_values_chunks
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+
+EXPORT_CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+class Echo:
+    """
+    File-like object whose `write` returns the value instead of buffering it,
+    so csv.writer output can be streamed.
+    """
+
+    def write(self, value):
+        return value
+
+
+def parse_export_bound(value, end_of_day=False):
+    """
+    Parses an ISO 8601 date or datetime used to filter an export.
+
+    Args:
+        value (str): The date ('2024-08-01') or datetime ('2024-08-01T12:00:00Z').
+        end_of_day (bool): Whether a plain date should cover the whole day (for upper bounds).
+
+    Returns:
+        datetime: An aware datetime, or None if no value was given.
+
+    Raises:
+        ValueError: If the value is not a valid date or datetime.
+    """
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date: {value!r}. Use YYYY-MM-DD or an ISO 8601 datetime.")
+        if end_of_day:
+            day += timedelta(days=1)
+        parsed = datetime.combine(day, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def export_queryset(user_id=None, since=None, until=None):
+    """
+    Builds the queryset of translations to export.
+
+    Args:
+        user_id (int): Only export translations of this user, if given.
+        since (datetime): Only export translations created at or after this time, if given.
+        until (datetime): Only export translations created before this time, if given.
+
+    Returns:
+        QuerySet: The matching translations.
+    """
+    translations = Translation.objects.all()
+    if user_id is not None:
+        translations = translations.filter(user_id=user_id)
+    if since is not None:
+        translations = translations.filter(created_at__gte=since)
+    if until is not None:
+        translations = translations.filter(created_at__lt=until)
+    return translations
+
+
+def stream_ndjson(chunks, to_representation):
+    """
+    Encodes chunks of rows as newline-delimited JSON, yielding a bytestring per chunk.
+
+    Args:
+        chunks (iterable): Chunks of rows, as produced by `iter_values_chunks`.
+        to_representation (callable): Converts a row into a JSON-serializable dict.
+
+    Yields:
+        bytes: One JSON document per line for every row of the chunk.
+    """
+    for rows in chunks:
+        yield ''.join(encode_json(to_representation(row)) + '\n' for row in rows).encode()
+
+
+def stream_csv(chunks, to_representation, field_names):
+    """
+    Encodes chunks of rows as CSV with a header line, yielding a bytestring per chunk.
+
+    Args:
+        chunks (iterable): Chunks of rows, as produced by `iter_values_chunks`.
+        to_representation (callable): Converts a row into a dict keyed by `field_names`.
+        field_names (list): The CSV columns.
+
+    Yields:
+        bytes: The header, then the CSV lines of each chunk.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(field_names).encode()
+    for rows in chunks:
+        lines = []
+        for row in rows:
+            data = to_representation(row)
+            lines.append(writer.writerow([data[name] for name in field_names]))
+        yield ''.join(lines).encode()
+
+
+def stream_export(queryset, export_format, chunk_size):
+    """
+    Streams the translations of a queryset in the requested export format.
+
+    Rows are fetched `chunk_size` at a time, so memory use does not grow with the
+    number of exported translations.
+
+    Args:
+        queryset (QuerySet): The translations to export.
+        export_format (str): One of EXPORT_FORMATS.
+        chunk_size (int): The number of rows fetched per database query.
+
+    Returns:
+        iterator: The encoded export as bytestrings.
+    """
+    serializer = TranslationValuesSerializer()
+    chunks = iter_values_chunks(queryset, serializer.columns, chunk_size)
+    if export_format == 'csv':
+        return stream_csv(chunks, serializer.to_representation, serializer.field_names)
+    return stream_ndjson(chunks, serializer.to_representation)
@@ -0,0 +1,149 @@
+import json
+import random
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeUpstreamConfig:
+    """
+    Behaviour of the fake translation upstream.
+
+    Attributes:
+        latency_ms (float): Median base latency of a request, in milliseconds.
+        latency_sigma (float): Spread of the log-normal latency distribution (0 for constant latency).
+        per_char_us (float): Additional latency per translated character, in microseconds.
+        error_rate (float): Probability that a request fails with 500 Internal Server Error.
+        throttle_rate (float): Probability that a request is rejected with 429 Too Many Requests.
+        seed (int): Seed of the random generator, for reproducible runs.
+    """
+
+    def __init__(self, latency_ms=100.0, latency_sigma=0.5, per_char_us=20.0, error_rate=0.0, throttle_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.per_char_us = per_char_us
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def sample(self, characters):
+        """
+        Draws the outcome of one request.
+
+        Args:
+            characters (int): The number of characters in the request.
+
+        Returns:
+            tuple: The latency in seconds and the HTTP status to answer with.
+        """
+        with self.lock:
+            latency = self.latency_ms * self.random.lognormvariate(0, self.latency_sigma) if self.latency_sigma else self.latency_ms
+            outcome = self.random.random()
+        latency = latency / 1000 + characters * self.per_char_us / 1_000_000
+        if outcome < self.throttle_rate:
+            return latency, HTTPStatus.TOO_MANY_REQUESTS
+        if outcome < self.throttle_rate + self.error_rate:
+            return latency, HTTPStatus.INTERNAL_SERVER_ERROR
+        return latency, HTTPStatus.OK
+
+
+class FakeUpstreamStats:
+    """
+    Thread-safe counters of the requests served by the fake upstream.
+    """
+    fields = ('calls', 'characters', 'throttled', 'errors')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.values = dict.fromkeys(self.fields, 0)
+
+    def add(self, **increments):
+        with self.lock:
+            for name, value in increments.items():
+                self.values[name] += value
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.values)
+
+
+class FakeUpstreamHandler(BaseHTTPRequestHandler):
+    """
+    Serves the subset of the DeepL API used by translation.utils.
+
+    POST /v2/translate answers like DeepL, with the text upper-cased as the "translation".
+    GET /stats returns the request counters and POST /stats/reset clears them.
+    """
+    server_version = 'FakeTranslationUpstream/1.0'
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self.send_json(HTTPStatus.OK, self.server.stats.snapshot())
+        else:
+            self.send_json(HTTPStatus.NOT_FOUND, {'message': 'Not found'})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self.path == '/stats/reset':
+            self.server.stats.reset()
+            self.send_json(HTTPStatus.OK, self.server.stats.snapshot())
+        elif self.path == '/v2/translate':
+            self.translate(json.loads(body or b'{}'))
+        else:
+            self.send_json(HTTPStatus.NOT_FOUND, {'message': 'Not found'})
+
+    def translate(self, request):
+        texts = request.get('text') or []
+        if isinstance(texts, str):
+            texts = [texts]
+        characters = sum(len(text) for text in texts)
+        latency, status = self.server.config.sample(characters)
+        time.sleep(latency)
+
+        if status == HTTPStatus.TOO_MANY_REQUESTS:
+            self.server.stats.add(calls=1, throttled=1)
+            self.send_json(status, {'message': 'Too many requests'})
+        elif status != HTTPStatus.OK:
+            self.server.stats.add(calls=1, errors=1)
+            self.send_json(status, {'message': 'Internal server error'})
+        else:
+            self.server.stats.add(calls=1, characters=characters)
+            translations = [{'detected_source_language': 'DE', 'text': text.upper()} for text in texts]
+            self.send_json(status, {'translations': translations})
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Keep load runs quiet; the counters are available on /stats
+        pass
+
+
+def make_fake_upstream(host='127.0.0.1', port=0, config=None):
+    """
+    Creates a fake upstream server. Call `serve_forever()` on it to start serving.
+
+    Args:
+        host (str): The interface to listen on.
+        port (int): The port to listen on, 0 to pick a free port.
+        config (FakeUpstreamConfig): The simulated behaviour, defaults if not given.
+
+    Returns:
+        ThreadingHTTPServer: The server, with `config` and `stats` attributes.
+    """
+    server = ThreadingHTTPServer((host, port), FakeUpstreamHandler)
+    server.daemon_threads = True
+    server.config = config or FakeUpstreamConfig()
+    server.stats = FakeUpstreamStats()
+    return server
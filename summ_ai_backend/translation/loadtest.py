@@ -0,0 +1,194 @@
+import math
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .workloads import make_rng, translate_payload
+
+# Operations the load test can issue, with the content type of the translate requests
+OPERATIONS = ('plain', 'html', 'list')
+
+
+def parse_mix(value):
+    """
+    Parses an operation mix such as 'plain=6,html=3,list=1'.
+
+    Args:
+        value (str): Comma-separated operation=weight pairs.
+
+    Returns:
+        dict: The weight of every operation.
+
+    Raises:
+        ValueError: If an operation is unknown or a weight is not a positive number.
+    """
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation {name!r}. Use {', '.join(OPERATIONS)}.")
+        mix[name] = float(weight or 1)
+        if mix[name] <= 0:
+            raise ValueError(f"The weight of {name!r} must be positive.")
+    return mix
+
+
+def percentile(sorted_values, fraction):
+    """
+    Returns the nearest-rank percentile of already sorted values, or None if there are none.
+    """
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    """
+    Summarizes the latencies (in seconds) of one group of requests.
+
+    Returns:
+        dict: Request and error counts, throughput and latency percentiles in milliseconds.
+    """
+    latencies = sorted(latencies)
+    milliseconds = lambda value: None if value is None else round(value * 1000, 2)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': {
+            'mean': milliseconds(sum(latencies) / len(latencies)) if latencies else None,
+            'p50': milliseconds(percentile(latencies, 0.50)),
+            'p95': milliseconds(percentile(latencies, 0.95)),
+            'p99': milliseconds(percentile(latencies, 0.99)),
+            'max': milliseconds(latencies[-1] if latencies else None),
+        },
+    }
+
+
+class LoadTest:
+    """
+    Drives the translation API with a weighted mix of plain and HTML translations
+    and list requests from concurrent clients, recording the latency of every request.
+    """
+
+    def __init__(self, base_url, username, password, concurrency, mix, upstream_url=None, seed=None, timeout=120):
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.password = password
+        self.concurrency = concurrency
+        self.mix = mix
+        self.upstream_url = upstream_url.rstrip('/') if upstream_url else None
+        self.seed = seed
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def login(self):
+        """
+        Obtains a JWT access token for the load test user.
+        """
+        response = requests.post(
+            f'{self.base_url}/api/login/',
+            json={'username': self.username, 'password': self.password},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()['access']
+
+    def upstream_stats(self):
+        """
+        Returns the counters of the fake upstream, or None if no upstream URL is configured.
+        """
+        if not self.upstream_url:
+            return None
+        response = requests.get(f'{self.upstream_url}/stats', timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def client(self, worker, token, deadline, budget):
+        """
+        Issues requests from one simulated client until the deadline or the shared budget is reached.
+        """
+        rng = make_rng(None if self.seed is None else self.seed + worker)
+        session = requests.Session()
+        session.headers['Authorization'] = f'Bearer {token}'
+        operations, weights = zip(*self.mix.items())
+
+        while time.perf_counter() < deadline:
+            with self.lock:
+                if budget is not None:
+                    if budget[0] <= 0:
+                        return
+                    budget[0] -= 1
+            operation = rng.choices(operations, weights)[0]
+            start = time.perf_counter()
+            try:
+                if operation == 'list':
+                    response = session.get(f'{self.base_url}/api/translations/', timeout=self.timeout)
+                else:
+                    payload = translate_payload(rng, operation)
+                    start = time.perf_counter()
+                    response = session.post(f'{self.base_url}/api/translate/', json=payload, timeout=self.timeout)
+                failed = response.status_code >= 400
+            except requests.RequestException:
+                failed = True
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.latencies[operation].append(elapsed)
+                if failed:
+                    self.errors[operation] += 1
+
+    def run(self, requests_count=None, duration=None):
+        """
+        Runs the load test.
+
+        Args:
+            requests_count (int): Stop after this many requests, if given.
+            duration (float): Stop after this many seconds, if given.
+
+        Returns:
+            dict: Machine-readable results: configuration, overall and per-operation
+                throughput and latency percentiles, and fake upstream call counts.
+        """
+        token = self.login()
+        before = self.upstream_stats()
+        budget = [requests_count] if requests_count is not None else None
+        started = time.perf_counter()
+        deadline = started + duration if duration else math.inf
+
+        with ThreadPoolExecutor(self.concurrency) as pool:
+            clients = [pool.submit(self.client, worker, token, deadline, budget) for worker in range(self.concurrency)]
+            for client in clients:
+                client.result()
+        elapsed = time.perf_counter() - started
+
+        after = self.upstream_stats()
+        upstream = {name: after[name] - before[name] for name in after} if after else None
+        all_latencies = [value for values in self.latencies.values() for value in values]
+        results = {
+            'config': {
+                'base_url': self.base_url,
+                'concurrency': self.concurrency,
+                'mix': self.mix,
+                'requests': requests_count,
+                'duration_s': duration,
+                'seed': self.seed,
+            },
+            'elapsed_s': round(elapsed, 3),
+            **summarize(all_latencies, sum(self.errors.values()), elapsed),
+            'by_operation': {
+                operation: summarize(self.latencies[operation], self.errors[operation], elapsed)
+                for operation in self.mix
+            },
+            'upstream': upstream,
+        }
+        translations = sum(len(self.latencies[operation]) for operation in ('plain', 'html'))
+        if upstream and translations:
+            upstream['calls_per_translation'] = round(upstream['calls'] / translations, 2)
+        return results
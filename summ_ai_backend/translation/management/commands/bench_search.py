@@ -0,0 +1,105 @@
+import itertools
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from translation.benchmarking import Rollback, best_of
+from translation.models import Translation
+from translation.search import search_index_available, search_translations
+
+SYLLABLES = 'ba be bi bo bu da de di do du ka ke ki ko ku la le li lo lu ma me mi mo mu na ne ni no nu ra re ri ro ru sa se si so su ta te ti to tu'.split()
+
+
+def make_vocabulary(rng, size):
+    """
+    Generates `size` distinct pseudo-words with Zipf-like weights, like natural language.
+
+    Returns:
+        tuple: The words, most frequent first, and their cumulative sampling weights.
+    """
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    words = sorted(words)
+    rng.shuffle(words)
+    return words, list(itertools.accumulate(1 / rank for rank in range(1, size + 1)))
+
+
+class Command(BaseCommand):
+    """
+    Benchmarks the FTS5 translation search against an icontains scan.
+    The benchmark rows are created inside a transaction that is rolled back afterwards.
+    """
+    help = 'Compare the FTS5 search index with an icontains scan on generated translations.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help='Number of translations to generate.')
+        parser.add_argument('--users', type=int, default=10, help='Number of users owning the translations.')
+        parser.add_argument('--vocabulary', type=int, default=20000, help='Number of distinct words in the generated text.')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per query; the best run is reported.')
+
+    def handle(self, *args, **options):
+        if not search_index_available():
+            raise CommandError('The database does not support the FTS5 search index.')
+        try:
+            with transaction.atomic():
+                self.run(options['rows'], options['users'], options['vocabulary'], options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, rows, users, vocabulary, repeat):
+        """
+        Generates `rows` translations and times both search paths for a few queries.
+
+        Args:
+            rows (int): The number of translations to generate.
+            users (int): The number of users the translations are spread over.
+            vocabulary (int): The number of distinct words in the generated text.
+            repeat (int): How many times each query is run.
+        """
+        owners = [User.objects.create_user(username=f'bench-search-{i}', password=None) for i in range(users)]
+        rng = random.Random(0)
+        words, weights = make_vocabulary(rng, vocabulary)
+        start = time.perf_counter()
+        Translation.objects.bulk_create(
+            (
+                Translation(
+                    user=owners[i % users],
+                    original_text=' '.join(rng.choices(words, cum_weights=weights, k=12)),
+                    translated_text=' '.join(rng.choices(words, cum_weights=weights, k=12)),
+                    content_type='plain',
+                )
+                for i in range(rows)
+            ),
+            batch_size=5000,
+        )
+        self.stdout.write(f'rows: {rows} ({rows // users} per user), indexed in {time.perf_counter() - start:.1f}s')
+
+        user = owners[0]
+        sample = Translation.objects.filter(user=user).order_by('pk').values_list('original_text', flat=True)[0].split()
+        queries = (
+            (words[0], words[0]),
+            (words[500], words[500]),
+            (f'"{sample[0]} {sample[1]}"', f'{sample[0]} {sample[1]}'),
+            (f'{words[50][:4]}*', words[50][:4]),
+        )
+        for query, phrase in queries:
+            fts_time, (fts_count, _) = best_of(lambda: search_translations(user, query, limit=20), repeat)
+
+            def scan():
+                matches = Translation.objects.filter(user=user).filter(
+                    Q(original_text__icontains=phrase) | Q(translated_text__icontains=phrase)
+                )
+                return matches.count(), list(matches.order_by('-created_at').values_list('id', flat=True)[:20])
+
+            scan_time, (scan_count, _) = best_of(scan, repeat)
+            self.stdout.write(
+                f'{query:<16} fts5: {fts_time * 1000:8.1f}ms ({fts_count} matches)   '
+                f'icontains: {scan_time * 1000:8.1f}ms ({scan_count} matches)   '
+                f'speedup: {scan_time / fts_time:.1f}x'
+            )
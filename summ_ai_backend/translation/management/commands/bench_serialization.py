@@ -0,0 +1,70 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from translation.benchmarking import Rollback, best_of
+from translation.models import Translation
+from translation.serializers import TranslationSerializer, TranslationValuesSerializer
+from translation.streaming import iter_values_chunks, stream_json_array
+
+
+class Command(BaseCommand):
+    """
+    Benchmarks the model serializer list path against the values fast path.
+    The benchmark rows are created inside a transaction that is rolled back afterwards.
+    """
+    help = 'Compare TranslationSerializer with the values fast path on generated rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help='Number of translations to generate.')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per path; the best run is reported.')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options['rows'], options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, rows, repeat):
+        """
+        Generates `rows` translations and times both serialization paths.
+
+        Args:
+            rows (int): The number of translations to generate.
+            repeat (int): How many times each path is run.
+        """
+        user = User.objects.create_user(username='bench-serialization', password=None)
+        Translation.objects.bulk_create(
+            (
+                Translation(
+                    user=user,
+                    original_text=f'Dies ist der Beispieltext Nummer {i}.',
+                    translated_text=f'This is sample text number {i}.',
+                    content_type='html' if i % 4 == 0 else 'plain',
+                )
+                for i in range(rows)
+            ),
+            batch_size=5000,
+        )
+        queryset = Translation.objects.filter(user=user).order_by('pk')
+
+        def model_path():
+            return JSONRenderer().render(TranslationSerializer(queryset, many=True).data)
+
+        def fast_path():
+            fast = TranslationValuesSerializer()
+            chunks = iter_values_chunks(queryset, fast.columns, settings.FAST_LIST_CHUNK_SIZE)
+            return b''.join(stream_json_array(chunks, fast.to_representation))
+
+        model_time, model_body = best_of(model_path, repeat)
+        fast_time, fast_body = best_of(fast_path, repeat)
+
+        self.stdout.write(f'rows:                  {rows}')
+        self.stdout.write(f'TranslationSerializer: {model_time:.3f}s')
+        self.stdout.write(f'values fast path:      {fast_time:.3f}s')
+        self.stdout.write(f'speedup:               {model_time / fast_time:.1f}x')
+        self.stdout.write(f'identical output:      {model_body == fast_body}')
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from translation.export import EXPORT_FORMATS, export_queryset, parse_export_bound, stream_export
+
+
+class Command(BaseCommand):
+    """
+    Streams translations to a file or stdout as NDJSON or CSV.
+    Rows are fetched in chunks, so memory use stays flat for any number of translations.
+    """
+    help = 'Export translations as NDJSON or CSV, optionally filtered by user and date range.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='export_format', choices=EXPORT_FORMATS, default='ndjson')
+        parser.add_argument('--user', type=int, help='Only export translations of this user id.')
+        parser.add_argument('--since', help='Only export translations created on or after this date/datetime.')
+        parser.add_argument('--until', help='Only export translations created before this datetime, or up to and including this date.')
+        parser.add_argument('--output', help='File to write to. Defaults to stdout.')
+        parser.add_argument('--chunk-size', type=int, default=settings.EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if options['user'] is not None and not User.objects.filter(id=options['user']).exists():
+            raise CommandError(f"User {options['user']} not found.")
+        try:
+            since = parse_export_bound(options['since'])
+            until = parse_export_bound(options['until'], end_of_day=True)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        translations = export_queryset(user_id=options['user'], since=since, until=until)
+        content = stream_export(translations, options['export_format'], options['chunk_size'])
+
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                for part in content:
+                    output.write(part)
+        else:
+            for part in content:
+                self.stdout.write(part.decode(), ending='')
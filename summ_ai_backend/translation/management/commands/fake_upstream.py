@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from translation.fake_upstream import FakeUpstreamConfig, make_fake_upstream
+
+
+class Command(BaseCommand):
+    """
+    Runs a local stand-in for the DeepL API with configurable latency and failures.
+    Point DEEPL_SERVER_URL at it (and set DEEPL_API_KEY to any value) to use it.
+    """
+    help = 'Serve a fake translation upstream speaking the DeepL /v2/translate API.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8001)
+        parser.add_argument('--latency-ms', type=float, default=100.0, help='Median base latency per request.')
+        parser.add_argument('--latency-sigma', type=float, default=0.5, help='Log-normal spread of the latency, 0 for constant.')
+        parser.add_argument('--per-char-us', type=float, default=20.0, help='Additional latency per character, in microseconds.')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests failing with 500.')
+        parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of requests rejected with 429.')
+        parser.add_argument('--seed', type=int, help='Random seed for reproducible runs.')
+
+    def handle(self, *args, **options):
+        config = FakeUpstreamConfig(
+            latency_ms=options['latency_ms'],
+            latency_sigma=options['latency_sigma'],
+            per_char_us=options['per_char_us'],
+            error_rate=options['error_rate'],
+            throttle_rate=options['throttle_rate'],
+            seed=options['seed'],
+        )
+        server = make_fake_upstream(options['host'], options['port'], config)
+        host, port = server.server_address[:2]
+        self.stdout.write(f'Fake translation upstream listening on http://{host}:{port}/ (stats on /stats)')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,48 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from translation.loadtest import LoadTest, parse_mix
+
+
+class Command(BaseCommand):
+    """
+    Load-tests a running instance of the API and prints the results as JSON.
+    Run the server against `python manage.py fake_upstream` to avoid spending DeepL quota.
+    """
+    help = 'Drive /api/translate/ and /api/translations/ with a payload mix and report throughput and latency as JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000', help='URL of the API under test.')
+        parser.add_argument('--username', required=True, help='User the load test logs in as.')
+        parser.add_argument('--password', required=True)
+        parser.add_argument('--concurrency', type=int, default=8, help='Number of concurrent clients.')
+        parser.add_argument('--requests', type=int, help='Total number of requests to send.')
+        parser.add_argument('--duration', type=float, help='Seconds to run for.')
+        parser.add_argument('--mix', default='plain=6,html=3,list=1', help='Weighted operation mix.')
+        parser.add_argument('--upstream-url', help='URL of the fake upstream, to report upstream call counts.')
+        parser.add_argument('--seed', type=int, help='Seed for reproducible payloads.')
+        parser.add_argument('--output', help='Also write the JSON results to this file.')
+
+    def handle(self, *args, **options):
+        if options['requests'] is None and options['duration'] is None:
+            raise CommandError('Pass --requests and/or --duration.')
+        try:
+            mix = parse_mix(options['mix'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        load_test = LoadTest(
+            options['base_url'],
+            options['username'],
+            options['password'],
+            concurrency=options['concurrency'],
+            mix=mix,
+            upstream_url=options['upstream_url'],
+            seed=options['seed'],
+        )
+        results = json.dumps(load_test.run(requests_count=options['requests'], duration=options['duration']), indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                output.write(results + '\n')
+        self.stdout.write(results)
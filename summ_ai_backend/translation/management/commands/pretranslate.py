@@ -0,0 +1,64 @@
+import multiprocessing
+import os
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from translation.pretranslate import pretranslate
+
+
+class Command(BaseCommand):
+    """
+    Translates a JSONL corpus ahead of time in a pool of worker processes.
+    Progress is checkpointed, so an interrupted run continues where it stopped.
+    """
+    help = 'Pre-translate a JSONL corpus with a process pool and store the translations in bulk.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('corpus', help='JSONL file with one {"original_text", "content_type", "dest_language"} object per line.')
+        parser.add_argument('--user', required=True, help='Username owning the stored translations.')
+        parser.add_argument('--dest-language', default='EN-US', help='Target language of lines without dest_language.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of worker processes.')
+        parser.add_argument('--window', type=int, help='Maximum documents in flight. Defaults to 4 per worker.')
+        parser.add_argument('--batch-size', type=int, default=100, help='Translations stored per transaction.')
+        parser.add_argument('--rate-limit', type=float, default=settings.UPSTREAM_RATE_LIMIT,
+                            help='Maximum upstream requests per second over all workers (0 = unlimited).')
+        parser.add_argument('--checkpoint', help='Checkpoint file. Defaults to <corpus>.checkpoint.')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint and start from the first line.')
+        parser.add_argument('--start-method', choices=multiprocessing.get_all_start_methods(),
+                            help='Multiprocessing start method of the workers. Defaults to the platform default.')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']} not found.")
+        if not os.path.exists(options['corpus']):
+            raise CommandError(f"Corpus {options['corpus']} not found.")
+
+        checkpoint = options['checkpoint'] or f"{options['corpus']}.checkpoint"
+        if options['restart'] and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        def progress(stats):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{stats['translated']} translated, {stats['chars_per_second']:.0f} chars/sec")
+
+        stats = pretranslate(
+            options['corpus'],
+            user,
+            checkpoint,
+            workers=options['workers'],
+            window=options['window'] or 4 * options['workers'],
+            batch_size=options['batch_size'],
+            rate_limit=options['rate_limit'],
+            default_language=options['dest_language'],
+            progress=progress,
+            start_method=options['start_method'],
+        )
+        self.stdout.write(
+            f"Translated {stats['translated']} documents ({stats['characters']} characters, "
+            f"{stats['skipped']} invalid lines skipped) in {stats['seconds']:.1f}s: "
+            f"{stats['chars_per_second']:.0f} chars/sec"
+        )
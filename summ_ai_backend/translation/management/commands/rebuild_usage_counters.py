@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from translation.usage import rebuild_usage_counters
+
+
+class Command(BaseCommand):
+    """
+    Recomputes the per-user usage counters from the stored translations.
+    """
+    help = 'Rebuild the usage counters from the translation history in streaming batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Translations fetched per database query.')
+
+    def handle(self, *args, **options):
+        written = rebuild_usage_counters(options['chunk_size'])
+        self.stdout.write(f'Rebuilt {written} usage counters.')
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from translation.segments import retry_all_failed_segments
+
+
+class Command(BaseCommand):
+    """
+    Retries the segments that could not be translated, e.g. after an upstream outage.
+    """
+    help = 'Send the failed segments of stored translations upstream again and patch the translations.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-attempts', type=int, help='Skip translations already retried this many times.')
+
+    def handle(self, *args, **options):
+        stats = retry_all_failed_segments(max_attempts=options['max_attempts'])
+        self.stdout.write(
+            f"Retried {stats['translations']} translations: {stats['repaired']} segments repaired, "
+            f"{stats['failed']} still failed."
+        )
@@ -0,0 +1,389 @@
+import atexit
+import fcntl
+import json
+import os
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from pathlib import Path
+
+from django.conf import settings
+
+# Bucket upper bounds, in seconds, from sub-millisecond parsing stages to slow upstream documents
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Files in METRICS_DIR: one per worker process, and the sum of the workers that have exited
+WORKER_FILE = re.compile(r'metrics-(\d+)-\d+\.json')
+EXITED_WORKERS_FILE = 'exited-workers.json'
+LOCK_FILE = 'metrics.lock'
+
+
+class Metric(ABC):
+    """
+    Base class of the metrics kept by this process.
+
+    Values are stored per label combination. Every process keeps its own values;
+    with METRICS_DIR set they are also written to a file per process, so the
+    /metrics endpoint of any worker can report the sum over all workers.
+
+    Attributes:
+        name (str): The metric name in the exposition format.
+        documentation (str): The HELP text.
+        labelnames (tuple): The names of the labels, in order.
+    """
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        REGISTRY.register(self)
+
+    def label_values(self, labels):
+        return tuple(map(str, map(labels.__getitem__, self.labelnames)))
+
+    @abstractmethod
+    def merge(self, total, values):
+        """
+        Adds the values of another process to `total`, both keyed by label values.
+        """
+
+    @abstractmethod
+    def samples(self, values):
+        """
+        Yields the samples of the summed values as (sample name, label values, extra labels, value).
+        """
+
+
+class Counter(Metric):
+    """
+    A monotonically increasing count, such as upstream calls or billed characters.
+    """
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.label_values(labels)
+        with REGISTRY.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+            if REGISTRY.flusher is None:
+                REGISTRY.start_flusher()
+            REGISTRY.dirty = True
+
+    def merge(self, total, values):
+        for key, value in values.items():
+            total[key] = total.get(key, 0) + value
+
+    def samples(self, values):
+        for key, value in sorted(values.items()):
+            yield self.name, key, (), value
+
+
+class Histogram(Metric):
+    """
+    A distribution of durations in seconds, counted into cumulative buckets.
+    """
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value, **labels):
+        key = self.label_values(labels)
+        # One count per bucket plus the +Inf bucket, then the sum
+        index = bisect_left(self.buckets, value)
+        with REGISTRY.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [0] * (len(self.buckets) + 2)
+            state[index] += 1
+            state[-1] += value
+            if REGISTRY.flusher is None:
+                REGISTRY.start_flusher()
+            REGISTRY.dirty = True
+
+    def time(self, **labels):
+        """
+        Returns a context manager observing the wall-clock duration of its `with` block,
+        including when it raises.
+        """
+        return Timer(self, labels)
+
+    def merge(self, total, values):
+        for key, state in values.items():
+            current = total.setdefault(key, [0] * len(state))
+            for index, value in enumerate(state):
+                current[index] += value
+
+    def samples(self, values):
+        bounds = [format_value(bound) for bound in self.buckets] + ['+Inf']
+        for key, state in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, state):
+                cumulative += count
+                yield f'{self.name}_bucket', key, (('le', bound),), cumulative
+            yield f'{self.name}_sum', key, (), state[-1]
+            yield f'{self.name}_count', key, (), cumulative
+
+
+class Timer:
+    """
+    Context manager returned by `Histogram.time`. A class rather than a generator,
+    as it runs several times per text node of a translated document.
+    """
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class Registry:
+    """
+    The metrics of this process and, if METRICS_DIR is set, the writer of their per-process file.
+    """
+    # Seconds between two writes of the per-process file
+    flush_interval = 1.0
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.file_name = self.make_file_name()
+        self.dirty = False
+        self.flusher = None
+
+    def make_file_name(self):
+        # The start time keeps a later process reusing the PID from overwriting this file
+        return f'metrics-{self.pid}-{time.time_ns()}.json'
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+
+    def reset_after_fork(self):
+        """
+        Starts afresh in a forked child process, which must not report its parent's values twice.
+        """
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.file_name = self.make_file_name()
+        self.dirty = False
+        self.flusher = None
+        for metric in self.metrics.values():
+            metric.values = {}
+
+    def start_flusher(self):
+        """
+        Starts the thread writing the per-process file on the first update. Called with the lock held.
+        """
+        if settings.METRICS_DIR:
+            self.flusher = threading.Thread(target=self.flush_periodically, name='metrics-flusher', daemon=True)
+            self.flusher.start()
+        else:
+            # Values stay in this process; do not look at the setting again on every update
+            self.flusher = False
+
+    def snapshot(self):
+        with self.lock:
+            return {name: {key: list(value) if isinstance(value, list) else value for key, value in metric.values.items()}
+                    for name, metric in self.metrics.items()}
+
+    def flush(self):
+        """
+        Writes the values of this process to its file in METRICS_DIR, atomically.
+        """
+        if not settings.METRICS_DIR:
+            return
+        with self.lock:
+            self.dirty = False
+        data = {name: [[list(key), value] for key, value in values.items()] for name, values in self.snapshot().items()}
+        write_metrics_file(Path(settings.METRICS_DIR) / self.file_name, data)
+
+    def flush_periodically(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush_if_dirty()
+
+    def flush_if_dirty(self):
+        if self.dirty:
+            self.flush()
+
+    def merge_file(self, totals, data):
+        """
+        Adds the values read from a metrics file to `totals`.
+        """
+        for name, items in data.items():
+            if name in self.metrics:
+                self.metrics[name].merge(totals[name], {tuple(key): value for key, value in items})
+
+    def fold_exited_workers(self, directory):
+        """
+        Adds the files of exited workers to the exited workers' file and deletes them, so a
+        scrape does not read one file per worker ever started. Called with the directory locked.
+
+        The names of the folded files are recorded until they are deleted, so a file is
+        not added twice if this process dies in between.
+        """
+        exited_path = directory / EXITED_WORKERS_FILE
+        exited = read_metrics_file(exited_path) or {'folded': [], 'values': {}}
+        totals = {name: {} for name in self.metrics}
+        self.merge_file(totals, exited['values'])
+        folded = []
+        for path in directory.glob('metrics-*.json'):
+            match = WORKER_FILE.fullmatch(path.name)
+            if not match or path.name == self.file_name or process_exists(int(match[1])):
+                continue
+            if path.name not in exited['folded']:
+                data = read_metrics_file(path)
+                if data is None:
+                    continue
+                self.merge_file(totals, data)
+            folded.append(path.name)
+        if not folded:
+            return
+
+        values = {name: [[list(key), value] for key, value in metric_totals.items()] for name, metric_totals in totals.items()}
+        write_metrics_file(exited_path, {'folded': folded, 'values': values})
+        for name in folded:
+            (directory / name).unlink(missing_ok=True)
+
+    def collect(self):
+        """
+        Returns the values of all metrics summed over this process and the files of the other workers.
+        Exited workers are included, so counters never go backwards after a worker restart.
+        """
+        totals = {name: {} for name in self.metrics}
+        for name, values in self.snapshot().items():
+            self.metrics[name].merge(totals[name], values)
+
+        if settings.METRICS_DIR and os.path.isdir(settings.METRICS_DIR):
+            directory = Path(settings.METRICS_DIR)
+            # Another worker folding files while they are read would count them twice or not at all
+            with open(directory / LOCK_FILE, 'a') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                self.fold_exited_workers(directory)
+                exited = read_metrics_file(directory / EXITED_WORKERS_FILE)
+                if exited:
+                    self.merge_file(totals, exited['values'])
+                for path in sorted(directory.glob('metrics-*.json')):
+                    if path.name == self.file_name:
+                        continue
+                    data = read_metrics_file(path)
+                    if data is not None:
+                        self.merge_file(totals, data)
+        return totals
+
+
+def process_exists(pid):
+    """
+    Returns whether a process with the given id is running.
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Running as another user
+        return True
+    return True
+
+
+def read_metrics_file(path):
+    """
+    Returns the parsed contents of a metrics file, or None if it was removed or is being replaced.
+    """
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def write_metrics_file(path, data):
+    """
+    Writes a metrics file atomically.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = path.with_suffix('.tmp')
+    temporary_path.write_text(json.dumps(data))
+    os.replace(temporary_path, path)
+
+
+def format_value(value):
+    """
+    Formats a sample value or bucket bound in the Prometheus text format.
+    """
+    if isinstance(value, float):
+        return repr(value) if not value.is_integer() else f'{value:.1f}'
+    return str(value)
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def render_metrics():
+    """
+    Renders all metrics, aggregated over the workers, in the Prometheus text exposition format.
+
+    Returns:
+        str: The exposition text.
+    """
+    lines = []
+    totals = REGISTRY.collect()
+    for name, metric in REGISTRY.metrics.items():
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.type}')
+        for sample_name, key, extra_labels, value in metric.samples(totals[name]):
+            labels = list(zip(metric.labelnames, key)) + list(extra_labels)
+            label_text = ','.join(f'{label}="{escape_label(label_value)}"' for label, label_value in labels)
+            lines.append(f'{sample_name}{{{label_text}}} {format_value(value)}' if labels
+                         else f'{sample_name} {format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+atexit.register(REGISTRY.flush_if_dirty)
+os.register_at_fork(after_in_child=REGISTRY.reset_after_fork)
+
+STAGE_SECONDS = Histogram(
+    'translation_stage_duration_seconds',
+    'Duration of the stages of a translation.',
+    ('stage',),
+)
+REQUEST_SECONDS = Histogram(
+    'translation_request_duration_seconds',
+    'Duration of /api/translate/ requests.',
+    ('content_type', 'status'),
+)
+UPSTREAM_CALLS = Counter(
+    'translation_upstream_calls_total',
+    'Requests sent to the translation upstream.',
+    ('outcome',),
+)
+UPSTREAM_RETRIES = Counter(
+    'translation_upstream_retries_total',
+    'Attempts of an upstream request after the first one failed.',
+)
+FALLBACKS = Counter(
+    'translation_fallbacks_total',
+    'Texts returned untranslated because their translation failed.',
+    ('level',),
+)
+BILLED_CHARACTERS = Counter(
+    'translation_billed_characters_total',
+    'Characters translated successfully by the upstream.',
+)
+SEGMENT_RETRIES = Counter(
+    'translation_segment_retries_total',
+    'Failed segments sent to the upstream again.',
+    ('outcome',),
+)
@@ -6,9 +6,46 @@ class Translation(models.Model):
     original_text = models.TextField()
     translated_text = models.TextField()
     content_type = models.CharField(max_length=10)
+    dest_language = models.CharField(max_length=10, blank=True, default='')
     created_at = models.DateTimeField(auto_now_add=True)
+    # [node, chunk] indexes of the segments left untranslated after an upstream failure
+    failed_segments = models.JSONField(default=list, blank=True)
+    # The translated chunks of every text node, kept while segments are failed so only those are retried
+    segments = models.JSONField(null=True, blank=True)
+    segment_retries = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Only translations with failed segments are indexed, for the retry sweep
+            models.Index(fields=['segment_retries'], condition=models.Q(segments__isnull=False), name='translation_failed_seg_idx'),
+        ]
 
     def __str__(self):
         
         # String representation of the Translation model instance
-        return f'Translation {self.id} by {self.user.username}'
\ No newline at end of file
+        return f'Translation {self.id} by {self.user.username}'
+
+class UsageCounter(models.Model):
+    """
+    Translation usage of one user on one day, per target language and content type.
+    Incremented when a translation is created, so usage reports do not scan Translation.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    day = models.DateField()
+    dest_language = models.CharField(max_length=10)
+    content_type = models.CharField(max_length=10)
+    requests = models.PositiveBigIntegerField(default=0)
+    characters = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day', 'dest_language', 'content_type'], name='unique_usage_counter'),
+        ]
+        indexes = [
+            models.Index(fields=['day']),
+        ]
+
+    def __str__(self):
+
+        # String representation of the UsageCounter model instance
+        return f'Usage of user {self.user_id} on {self.day} ({self.dest_language}, {self.content_type})'
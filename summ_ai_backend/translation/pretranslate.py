@@ -0,0 +1,179 @@
+import json
+import multiprocessing
+import os
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Translation
+from .pretranslate_worker import SharedRateLimiter, init_worker, translate_document
+from .usage import record_usage
+
+
+def read_corpus(path, start_line, default_language):
+    """
+    Reads a JSONL corpus lazily, starting after the checkpointed line.
+
+    Every line is a JSON object with a string 'original_text' and optionally 'content_type'
+    ('plain' or 'html', default 'plain') and a string 'dest_language'. Other lines are invalid.
+
+    Args:
+        path (str): The corpus file.
+        start_line (int): The number of lines already processed.
+        default_language (str): The target language of lines without 'dest_language'.
+
+    Yields:
+        tuple: The line number and the document, or None for invalid lines.
+    """
+    with open(path, encoding='utf-8') as corpus:
+        for line_number, line in enumerate(corpus, start=1):
+            if line_number <= start_line:
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError:
+                data = None
+            if not isinstance(data, dict) or not data.get('original_text') \
+                    or not isinstance(data['original_text'], str) \
+                    or data.get('content_type', 'plain') not in ('plain', 'html') \
+                    or not isinstance(data.get('dest_language') or '', str):
+                yield line_number, None
+                continue
+            document = {
+                'original_text': data['original_text'],
+                'content_type': data.get('content_type', 'plain'),
+                'dest_language': (data.get('dest_language') or default_language).upper(),
+            }
+            yield line_number, document
+
+
+def load_checkpoint(path):
+    """
+    Returns the number of corpus lines already processed according to the checkpoint file.
+    """
+    if not os.path.exists(path):
+        return 0
+    with open(path, encoding='utf-8') as checkpoint:
+        return json.load(checkpoint)['line']
+
+
+def save_checkpoint(path, line):
+    """
+    Atomically records that the first `line` corpus lines have been processed.
+    """
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as checkpoint:
+        json.dump({'line': line}, checkpoint)
+    os.replace(temporary_path, path)
+
+
+def store_batch(user, batch):
+    """
+    Stores translated documents in bulk and adds them to the usage counters.
+    Failed segments are stored for `python manage.py retry_failed_segments`.
+
+    Args:
+        user (User): The owner of the stored translations.
+        batch (list): Pairs of documents and their `translate_document` result.
+    """
+    translations = [
+        Translation(
+            user=user,
+            original_text=document['original_text'],
+            translated_text=translated_text,
+            content_type=document['content_type'],
+            dest_language=document['dest_language'],
+            failed_segments=failed_segments,
+            segments=segments if failed_segments else None,
+        )
+        for document, (translated_text, failed_segments, segments) in batch
+    ]
+    usage = defaultdict(lambda: [0, 0])
+    for translation in translations:
+        counter = usage[(translation.dest_language, translation.content_type)]
+        counter[0] += 1
+        counter[1] += len(translation.original_text)
+
+    today = timezone.localdate()
+    # Counters first, so the transaction holds the write lock before the inserts fire
+    # the search index triggers (see TranslationCreateView.post)
+    with transaction.atomic():
+        for (dest_language, content_type), (requests, characters) in usage.items():
+            record_usage(user.id, today, dest_language, content_type, characters, requests=requests)
+        Translation.objects.bulk_create(translations)
+
+
+def pretranslate(corpus_path, user, checkpoint_path, workers, window, batch_size,
+                 rate_limit=0, default_language='EN-US', progress=None, start_method=None):
+    """
+    Translates a JSONL corpus in a process pool and stores the results.
+
+    At most `window` documents are in flight at a time, so memory use does not depend on
+    the corpus size. Results are stored in corpus order, `batch_size` at a time, and the
+    checkpoint is advanced after every stored batch so an interrupted run resumes after
+    the last stored line.
+
+    Args:
+        corpus_path (str): The JSONL corpus.
+        user (User): The owner of the stored translations.
+        checkpoint_path (str): The checkpoint file.
+        workers (int): The number of worker processes.
+        window (int): The maximum number of documents submitted but not yet stored.
+        batch_size (int): The number of translations stored per transaction.
+        rate_limit (float): Maximum upstream requests per second over all workers, 0 for no limit.
+        default_language (str): The target language of lines without 'dest_language'.
+        progress (callable): Called with the statistics after every stored batch, if given.
+        start_method (str): The multiprocessing start method of the workers, the platform default if None.
+
+    Returns:
+        dict: The number of translated and skipped lines, characters and chars/sec.
+    """
+    context = multiprocessing.get_context(start_method)
+    rate_limiter = SharedRateLimiter(rate_limit, context) if rate_limit else None
+    stats = {'translated': 0, 'skipped': 0, 'characters': 0, 'seconds': 0.0, 'chars_per_second': 0.0}
+    start_line = load_checkpoint(checkpoint_path)
+    started = time.perf_counter()
+
+    def flush(batch, line):
+        if batch:
+            store_batch(user, batch)
+        save_checkpoint(checkpoint_path, line)
+        stats['seconds'] = time.perf_counter() - started
+        stats['chars_per_second'] = stats['characters'] / stats['seconds'] if stats['seconds'] else 0.0
+        if progress:
+            progress(stats)
+
+    # Workers only call the translation utilities; the database is used by this process alone
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=init_worker, initargs=(rate_limiter,)) as pool:
+        pending = deque()
+        batch = []
+        line = start_line
+        documents = read_corpus(corpus_path, start_line, default_language)
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < window:
+                item = next(documents, None)
+                if item is None:
+                    exhausted = True
+                    break
+                line_number, document = item
+                future = pool.submit(translate_document, document) if document else None
+                pending.append((line_number, document, future))
+            if not pending:
+                break
+
+            line, document, future = pending.popleft()
+            if document is None:
+                stats['skipped'] += 1
+            else:
+                batch.append((document, future.result()))
+                stats['translated'] += 1
+                stats['characters'] += len(document['original_text'])
+            if len(batch) >= batch_size:
+                flush(batch, line)
+                batch = []
+        flush(batch, line)
+    return stats
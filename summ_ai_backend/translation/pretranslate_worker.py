@@ -0,0 +1,56 @@
+import multiprocessing
+import time
+
+import django
+from django.apps import apps
+
+from .utils import set_upstream_rate_limiter, translate_segments
+
+# The code run by the pretranslate worker processes. Workers started with the spawn or
+# forkserver method import this module before Django is set up, so it must not import
+# the models.
+
+
+class SharedRateLimiter:
+    """
+    Rate limiter shared by all worker processes of a pool.
+    Hands out evenly spaced time slots, `rate` per second, from a shared clock.
+    """
+
+    def __init__(self, rate, context=multiprocessing):
+        self.interval = 1.0 / rate
+        self.next_slot = context.Value('d', 0.0)
+
+    def acquire(self):
+        """
+        Blocks until the caller may send the next upstream request.
+        """
+        with self.next_slot.get_lock():
+            now = time.time()
+            slot = max(now, self.next_slot.value)
+            self.next_slot.value = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def init_worker(rate_limiter):
+    """
+    Process pool initializer setting up Django, unless the worker was forked from a process
+    that already did, and installing the shared upstream rate limiter.
+    """
+    if not apps.ready:
+        django.setup()
+    set_upstream_rate_limiter(rate_limiter)
+
+
+def translate_document(document):
+    """
+    Translates one corpus document in a worker process.
+
+    Args:
+        document (dict): The parsed corpus line with 'original_text', 'content_type' and 'dest_language'.
+
+    Returns:
+        tuple: The translated text, the failed segments and the translated chunks (see `translate_segments`).
+    """
+    return translate_segments(document['original_text'], document['content_type'], document['dest_language'])
@@ -0,0 +1,323 @@
+import contextvars
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import RequestDataTooBig
+from django.http.request import RawPostDataException
+from django.utils import timezone
+
+# Request header with which admin users ask for their request to be profiled
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+
+# Only one request is profiled at a time per process
+profiling_lock = threading.Lock()
+
+# The sampler of the request being profiled, in the request thread and the executor threads it starts
+current_sampler = contextvars.ContextVar('current_sampler', default=None)
+
+
+def register_thread(sampler):
+    """
+    Executor thread initializer: samples this thread if `sampler` is set, and passes it
+    on to the executors this thread starts.
+    """
+    if sampler is not None:
+        sampler.thread_ids.add(threading.get_ident())
+        current_sampler.set(sampler)
+
+
+class ProfiledThreadPoolExecutor(ThreadPoolExecutor):
+    """
+    ThreadPoolExecutor whose threads are sampled with the request that starts it, if that
+    request is profiled. Other requests running at the same time are not sampled.
+    """
+
+    def __init__(self, max_workers=None, thread_name_prefix=''):
+        super().__init__(max_workers, thread_name_prefix, initializer=register_thread, initargs=(current_sampler.get(),))
+
+
+def frame_label(code, path_prefixes):
+    """
+    Returns the name of a stack frame in a collapsed stack, e.g. 'translate_chunk (translation/utils.py:40)'.
+    File names are shortened relative to the first of `path_prefixes` they start with.
+    """
+    filename = code.co_filename
+    for prefix in path_prefixes:
+        if filename.startswith(prefix):
+            filename = filename[len(prefix):]
+            break
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+class StackSampler(threading.Thread):
+    """
+    Wall-clock sampling profiler.
+
+    Every `interval` seconds it records the stacks of the profiled request's thread and of
+    the ProfiledThreadPoolExecutor threads it starts, e.g. in translate_html and
+    translate_text, whether they are computing or waiting on the upstream. Stacks without
+    project code, such as idle executor threads, are ignored.
+
+    Attributes:
+        interval (float): The sampling interval in seconds.
+        samples (int): The number of sampling rounds.
+        stacks (Counter): The number of samples per collapsed stack ('thread;outer;...;inner').
+        thread_ids (set): The idents of the sampled threads.
+    """
+
+    def __init__(self, interval):
+        super().__init__(name='profiling-sampler', daemon=True)
+        self.interval = interval
+        self.samples = 0
+        self.stacks = Counter()
+        self.thread_ids = set()
+        self.stopped = threading.Event()
+        self.project_dir = str(settings.BASE_DIR)
+        # The project first, then the import paths, longest first so site-packages wins over lib/python3.x
+        import_paths = sorted((path for path in sys.path if path and os.path.isabs(path)), key=len, reverse=True)
+        self.path_prefixes = [os.path.join(path, '') for path in [self.project_dir] + import_paths]
+
+    def is_project_code(self, filename):
+        return filename.startswith(self.project_dir) and 'site-packages' not in filename and filename != __file__
+
+    def sample(self):
+        threads = {thread.ident: thread.name for thread in threading.enumerate()}
+        frames = sys._current_frames()
+        for thread_id in tuple(self.thread_ids):
+            frame = frames.get(thread_id)
+            codes = []
+            relevant = False
+            while frame is not None:
+                codes.append(frame.f_code)
+                relevant = relevant or self.is_project_code(frame.f_code.co_filename)
+                frame = frame.f_back
+            if relevant:
+                # 'ThreadPoolExecutor-3_1' and 'ThreadPoolExecutor-7_0' are the same kind of thread
+                thread_name = re.sub(r'[-_\d]+$', '', threads.get(thread_id, 'thread'))
+                self.stacks[';'.join([thread_name] + [frame_label(code, self.path_prefixes) for code in reversed(codes)])] += 1
+        self.samples += 1
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def size_bucket(size):
+    """
+    Rounds a size up to a power of two, so similar payloads get the same shape.
+    """
+    return 0 if size <= 0 else 2 ** math.ceil(math.log2(size))
+
+
+def payload_shape(data):
+    """
+    Describes the structure of a request payload without its content: the keys, the value
+    types and the sizes of strings and lists rounded up to a power of two. Strings that look
+    like HTML also report their number of tags.
+
+    Args:
+        data: The parsed JSON payload.
+
+    Returns:
+        The shape, made of dicts, lists and strings.
+    """
+    if isinstance(data, dict):
+        return {str(key): payload_shape(value) for key, value in sorted(data.items())}
+    if isinstance(data, list):
+        return [f'list[{size_bucket(len(data))}]'] + [payload_shape(value) for value in data[:1]]
+    if isinstance(data, str):
+        if data.lstrip().startswith('<'):
+            return f'html[{size_bucket(len(data))}, tags={size_bucket(len(re.findall(r"<[a-zA-Z]", data)))}]'
+        return f'str[{size_bucket(len(data))}]'
+    return type(data).__name__
+
+
+def request_payload_shape(request):
+    """
+    Returns the shape of the request body and its hash, or (None, None) without a JSON body.
+
+    Bodies over DATA_UPLOAD_MAX_MEMORY_SIZE get no shape: reading them here would fail the
+    request, which the view would have read as a stream.
+    """
+    if request.content_type != 'application/json':
+        return None, None
+    max_size = settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+    if max_size is not None and int(request.META.get('CONTENT_LENGTH') or 0) > max_size:
+        return None, None
+    try:
+        body = request.body
+    except (RequestDataTooBig, RawPostDataException):
+        return None, None
+    if not body:
+        return None, None
+    try:
+        shape = payload_shape(json.loads(body))
+    except ValueError:
+        return None, None
+    return shape, hashlib.sha256(json.dumps(shape, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def profile_dir():
+    return Path(settings.PROFILING_DIR)
+
+
+def store_profile(profile):
+    """
+    Writes a profile to PROFILING_DIR and deletes the oldest profiles beyond PROFILING_MAX_PROFILES.
+    """
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{profile['id']}.json"
+    temporary_path = path.with_suffix('.tmp')
+    temporary_path.write_text(json.dumps(profile))
+    os.replace(temporary_path, path)
+
+    # Profile ids start with their creation time, so sorting by name sorts by age
+    paths = sorted(directory.glob('*.json'))
+    for old_path in paths[:max(0, len(paths) - settings.PROFILING_MAX_PROFILES)]:
+        old_path.unlink(missing_ok=True)
+
+
+def list_profiles():
+    """
+    Returns the summaries of the stored profiles, newest first, without their stacks.
+    """
+    profiles = []
+    for path in sorted(profile_dir().glob('*.json'), reverse=True):
+        try:
+            profile = json.loads(path.read_text())
+        except (OSError, ValueError):
+            # Deleted by the retention cap while listing
+            continue
+        profile.pop('stacks')
+        profiles.append(profile)
+    return profiles
+
+
+def load_profile(profile_id):
+    """
+    Returns the stored profile `profile_id`, or None if it does not exist.
+    """
+    if not re.fullmatch(r'[\w-]+', profile_id):
+        return None
+    path = profile_dir() / f'{profile_id}.json'
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def collapsed_stacks(profile):
+    """
+    Returns the stacks of a profile in the collapsed format read by flamegraph.pl and speedscope.
+    """
+    return ''.join(f'{stack} {count}\n' for stack, count in sorted(profile['stacks'].items()))
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests with a wall-clock sampler and stores the profiles in PROFILING_DIR.
+
+    A request is profiled if PROFILING_SAMPLE_RATE selects it at random, or if an admin
+    user (JWT or session) sends the 'X-Profile: 1' header. The id of the stored profile
+    is returned in the 'X-Profile-Id' response header. Without either, the middleware
+    only checks the sample rate and the header.
+
+    The middleware is synchronous, so under ASGI the view runs in the thread that is
+    sampled rather than in a thread the middleware cannot tell apart from other requests.
+    """
+    sync_capable = True
+    async_capable = False
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.should_profile(request) or not profiling_lock.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            capture = self.start(request)
+            sampler = capture[1]
+            token = current_sampler.set(sampler)
+            try:
+                response = self.get_response(request)
+            finally:
+                current_sampler.reset(token)
+                sampler.stop()
+            self.finish(request, response, capture)
+        finally:
+            profiling_lock.release()
+        return response
+
+    def should_profile(self, request):
+        if settings.PROFILING_SAMPLE_RATE and random.random() < settings.PROFILING_SAMPLE_RATE:
+            return True
+        return request.META.get(PROFILE_HEADER) == '1' and self.is_admin(request)
+
+    def is_admin(self, request):
+        """
+        Returns whether the request comes from an admin user, authenticated by JWT or session.
+        The API authenticates in the views, so the JWT is checked here as well.
+        """
+        # Imported here, as it needs the apps loaded and this module is imported by the utils
+        from rest_framework_simplejwt.authentication import JWTAuthentication
+
+        try:
+            authenticated = JWTAuthentication().authenticate(request)
+        except Exception:
+            authenticated = None
+        user = authenticated[0] if authenticated else getattr(request, 'user', None)
+        return bool(user and user.is_active and user.is_staff)
+
+    def start(self, request):
+        """
+        Starts sampling. The payload shape is taken first, as the body cannot be read after the view.
+
+        Returns:
+            tuple: The profile metadata, the running sampler and the start time.
+        """
+        shape, shape_hash = request_payload_shape(request)
+        now = timezone.now()
+        profile = {
+            'id': f"{now:%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}",
+            'created_at': now.isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'payload_shape_hash': shape_hash,
+            'payload_shape': shape,
+        }
+        sampler = StackSampler(settings.PROFILING_INTERVAL_MS / 1000)
+        sampler.thread_ids.add(threading.get_ident())
+        sampler.start()
+        return profile, sampler, time.perf_counter()
+
+    def finish(self, request, response, capture):
+        """
+        Stores the profile of a stopped sampler and adds its id to the response.
+        """
+        profile, sampler, started = capture
+        duration = time.perf_counter() - started
+        store_profile({
+            **profile,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'interval_ms': settings.PROFILING_INTERVAL_MS,
+            'samples': sampler.samples,
+            'stacks': dict(sampler.stacks),
+        })
+        response['X-Profile-Id'] = profile['id']
@@ -0,0 +1,171 @@
+import functools
+import re
+import sqlite3
+
+from django.db import connection, connections
+from django.db.models import Q
+
+from .models import Translation
+
+SEARCH_TABLE = 'translation_translation_fts'
+
+# External content FTS5 index over Translation. user_id is indexed as a token so the
+# per-user filter is resolved inside the index instead of by joining every match.
+# The triggers keep it in sync on insert, update and delete, including bulk_create,
+# queryset deletes and cascades. Updates of other columns, such as the segment retries,
+# leave the index alone. The update trigger is dropped first, so databases indexed
+# before it was restricted to the indexed columns get the current one.
+SEARCH_COLUMNS = 'user_id, original_text, translated_text'
+
+SEARCH_INDEX_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        {SEARCH_COLUMNS},
+        content='translation_translation', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_insert AFTER INSERT ON translation_translation BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, {SEARCH_COLUMNS})
+        VALUES (new.id, new.user_id, new.original_text, new.translated_text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_delete AFTER DELETE ON translation_translation BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, {SEARCH_COLUMNS})
+        VALUES ('delete', old.id, old.user_id, old.original_text, old.translated_text);
+    END
+    """,
+    f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_update",
+    f"""
+    CREATE TRIGGER {SEARCH_TABLE}_update AFTER UPDATE OF {SEARCH_COLUMNS} ON translation_translation BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, {SEARCH_COLUMNS})
+        VALUES ('delete', old.id, old.user_id, old.original_text, old.translated_text);
+        INSERT INTO {SEARCH_TABLE}(rowid, {SEARCH_COLUMNS})
+        VALUES (new.id, new.user_id, new.original_text, new.translated_text);
+    END
+    """,
+]
+
+# A double-quoted phrase or a single word, optionally ending with '*' for a prefix query
+QUERY_TOKEN = re.compile(r'"([^"]*)"(\*?)|(\S+)')
+
+
+def search_index_available(using=connection):
+    """
+    Checks whether the database supports the FTS5 search index.
+
+    Args:
+        using: The database connection to check.
+
+    Returns:
+        bool: True for SQLite builds with FTS5 enabled.
+    """
+    return using.vendor == 'sqlite' and sqlite_has_fts5()
+
+
+@functools.cache
+def sqlite_has_fts5():
+    """
+    Checks once per process whether the linked SQLite library was built with FTS5.
+    """
+    probe = sqlite3.connect(':memory:')
+    try:
+        return bool(probe.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')").fetchone()[0])
+    finally:
+        probe.close()
+
+
+def ensure_search_index(using=connection):
+    """
+    Creates the FTS5 table and its sync triggers if they do not exist yet.
+    A newly created index is filled from the existing translations.
+
+    Args:
+        using: The database connection to create the index on.
+    """
+    if not search_index_available(using):
+        return
+    with using.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = %s", [SEARCH_TABLE])
+        created = cursor.fetchone() is None
+        for statement in SEARCH_INDEX_SQL:
+            cursor.execute(statement)
+        if created:
+            cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')")
+
+
+def create_search_index(sender, using, **kwargs):
+    """
+    post_migrate receiver creating the search index on the migrated database.
+    """
+    ensure_search_index(connections[using])
+
+
+def build_match_expression(query):
+    """
+    Converts a user query into a safe FTS5 MATCH expression.
+
+    Words and "quoted phrases" must all match; a trailing '*' makes a word or phrase a
+    prefix query (for a phrase, its last word is the prefix). Every term is quoted, so FTS5
+    operators in the input are matched literally.
+
+    Args:
+        query (str): The search query entered by the user.
+
+    Returns:
+        str: The MATCH expression, or an empty string if the query has no terms.
+    """
+    terms = []
+    for phrase, phrase_star, word in QUERY_TOKEN.findall(query):
+        text = phrase if phrase else word.rstrip('*')
+        prefix = bool(phrase_star) if phrase else word.endswith('*')
+        text = text.strip()
+        if not text:
+            continue
+        term = '"' + text.replace('"', '""') + '"'
+        terms.append(term + '*' if prefix else term)
+    return ' '.join(terms)
+
+
+def search_translations(user, query, limit, offset=0):
+    """
+    Searches the translations of a user, best matches first.
+
+    Uses the FTS5 index ranked by bm25 when available, otherwise falls back to a
+    case-insensitive scan ordered by newest first.
+
+    Args:
+        user (User): The user whose translations are searched.
+        query (str): The search query entered by the user.
+        limit (int): The maximum number of results.
+        offset (int): The number of results to skip.
+
+    Returns:
+        tuple: The total number of matches and the list of matching translation ids.
+    """
+    expression = build_match_expression(query)
+    if not expression:
+        return 0, []
+
+    if not search_index_available():
+        phrases = [phrase or word.rstrip('*') for phrase, _, word in QUERY_TOKEN.findall(query)]
+        translations = Translation.objects.filter(user=user)
+        for phrase in filter(None, (p.strip() for p in phrases)):
+            translations = translations.filter(Q(original_text__icontains=phrase) | Q(translated_text__icontains=phrase))
+        ids = translations.order_by('-created_at', '-id').values_list('id', flat=True)
+        return ids.count(), list(ids[offset:offset + limit])
+
+    # Restrict the user's terms to the text columns and the owner to user_id
+    match_expression = f'user_id : "{int(user.id)}" AND {{original_text translated_text}} : ({expression})'
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT count(*) FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s", [match_expression])
+        count = cursor.fetchone()[0]
+        cursor.execute(
+            f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s "
+            f"ORDER BY bm25({SEARCH_TABLE}, 0.0, 1.0, 1.0), rowid DESC LIMIT %s OFFSET %s",
+            [match_expression, limit, offset],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+    return count, ids
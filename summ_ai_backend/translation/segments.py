@@ -0,0 +1,154 @@
+import heapq
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from .metrics import SEGMENT_RETRIES
+from .models import Translation
+from .utils import UntranslatedText, render_segments, retranslate_segments
+
+logger = logging.getLogger(__name__)
+
+
+def retry_failed_segments(translation):
+    """
+    Sends only the failed segments of a translation upstream again and patches the stored
+    translation in place with the segments that succeed.
+
+    The update only applies if no other retry patched the translation in the meantime.
+
+    Args:
+        translation (Translation): The translation, as loaded before the retry.
+
+    Returns:
+        int: The number of segments still failed, or None if another retry patched the translation first.
+    """
+    if not translation.failed_segments:
+        return 0
+    segments = translation.segments
+    failed_segments = translation.failed_segments
+    sources = [segments[node][chunk] for node, chunk in failed_segments]
+    results = retranslate_segments(sources, translation.dest_language)
+
+    still_failed = []
+    for (node, chunk), result in zip(failed_segments, results):
+        segments[node][chunk] = str(result)
+        if isinstance(result, UntranslatedText):
+            still_failed.append([node, chunk])
+    SEGMENT_RETRIES.inc(len(sources) - len(still_failed), outcome='success')
+    SEGMENT_RETRIES.inc(len(still_failed), outcome='failure')
+
+    patched = Translation.objects.filter(pk=translation.pk, segment_retries=translation.segment_retries).update(
+        translated_text=render_segments(translation.original_text, translation.content_type, segments),
+        failed_segments=still_failed,
+        # The chunks are only needed while some are still to be retried
+        segments=segments if still_failed else None,
+        segment_retries=translation.segment_retries + 1,
+    )
+    return len(still_failed) if patched else None
+
+
+class SegmentRetryScheduler:
+    """
+    Retries the failed segments of new translations in a background thread of this process,
+    waiting SEGMENT_RETRY_DELAY seconds before the first retry and doubling the delay after
+    each failed one, up to SEGMENT_RETRY_MAX_ATTEMPTS retries.
+
+    Scheduled retries are lost when the process stops; `python manage.py retry_failed_segments`
+    retries every translation that still has failed segments.
+    """
+
+    def __init__(self):
+        # Heap of (due time, translation id)
+        self.queue = []
+        self.condition = threading.Condition()
+        self.thread = None
+        self.stopped = False
+
+    def schedule(self, translation_id, attempt=0):
+        """
+        Schedules retry number `attempt` (from 0) of the failed segments of a translation.
+        """
+        delay = settings.SEGMENT_RETRY_DELAY * 2 ** attempt
+        with self.condition:
+            if self.stopped:
+                return
+            heapq.heappush(self.queue, (time.monotonic() + delay, translation_id))
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='segment-retry', daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.stopped and (not self.queue or self.queue[0][0] > time.monotonic()):
+                    self.condition.wait(self.queue[0][0] - time.monotonic() if self.queue else None)
+                if self.stopped:
+                    return
+                _, translation_id = heapq.heappop(self.queue)
+            self.retry(translation_id)
+
+    def stop(self):
+        """
+        Drops the scheduled retries and waits for the retry in progress, if any.
+        Retries scheduled afterwards are ignored.
+        """
+        with self.condition:
+            self.stopped = True
+            self.queue.clear()
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+
+    def retry(self, translation_id):
+        try:
+            translation = Translation.objects.filter(pk=translation_id).first()
+            if translation is None or not translation.failed_segments:
+                return
+            if retry_failed_segments(translation) and translation.segment_retries + 1 < settings.SEGMENT_RETRY_MAX_ATTEMPTS:
+                self.schedule(translation_id, translation.segment_retries + 1)
+        except Exception:
+            logger.exception(f"Error retrying the failed segments of translation {translation_id}")
+        finally:
+            # This thread is not a request, so Django does not close its connection
+            connection.close()
+
+
+segment_retry_scheduler = SegmentRetryScheduler()
+
+
+def schedule_segment_retry(translation_id):
+    """
+    Retries the failed segments of a new translation in the background, unless SEGMENT_RETRY_DELAY is 0.
+    """
+    if settings.SEGMENT_RETRY_DELAY:
+        segment_retry_scheduler.schedule(translation_id)
+
+
+def retry_all_failed_segments(max_attempts=None):
+    """
+    Retries the failed segments of every stored translation that has some, oldest first.
+
+    Args:
+        max_attempts (int): Skip translations already retried this many times, if given.
+
+    Returns:
+        dict: The number of translations retried, and of segments repaired and still failed.
+    """
+    stats = {'translations': 0, 'repaired': 0, 'failed': 0}
+    translations = Translation.objects.filter(segments__isnull=False).order_by('pk')
+    if max_attempts is not None:
+        translations = translations.filter(segment_retries__lt=max_attempts)
+    for translation in translations.iterator(chunk_size=100):
+        failed = len(translation.failed_segments)
+        remaining = retry_failed_segments(translation)
+        if remaining is None:
+            continue
+        stats['translations'] += 1
+        stats['repaired'] += failed - remaining
+        stats['failed'] += remaining
+    return stats
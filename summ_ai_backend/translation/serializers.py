@@ -1,4 +1,6 @@
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.utils import timezone
 from rest_framework import serializers
 from .models import Translation
 
@@ -47,3 +49,58 @@ class TranslationSerializer(serializers.ModelSerializer):
         model = Translation
         fields = ['id', 'user', 'original_text', 'translated_text', 'content_type', 'created_at']
         read_only_fields = ['id', 'user', 'created_at']  
+
+class ValuesSerializer:
+    """
+    Read-only fast path for list endpoints.
+    Serializes rows fetched with `values_list` instead of model instances, producing
+    the same field output as the matching ModelSerializer.
+    """
+    model_serializer = None
+    columns = ()
+
+    def __init__(self):
+        self.field_names = self.model_serializer.Meta.fields
+
+    def to_representation(self, row):
+        """
+        Convert a `values_list` row into a dictionary keyed like the model serializer.
+
+        Args:
+            row (tuple): The values fetched for `columns`.
+
+        Returns:
+            dict: The serialized row.
+        """
+        return dict(zip(self.field_names, row))
+
+class UserValuesSerializer(ValuesSerializer):
+    """
+    Fast path equivalent of UserSerializer.
+    """
+    model_serializer = UserSerializer
+    columns = ('id', 'username', 'email')
+
+class TranslationValuesSerializer(ValuesSerializer):
+    """
+    Fast path equivalent of TranslationSerializer.
+    """
+    model_serializer = TranslationSerializer
+    columns = ('id', 'user_id', 'original_text', 'translated_text', 'content_type', 'created_at')
+
+    def __init__(self):
+        super().__init__()
+        # Resolve the output timezone once instead of once per row
+        output_timezone = timezone.get_current_timezone() if settings.USE_TZ else None
+        self.created_at_field = serializers.DateTimeField(default_timezone=output_timezone)
+
+    def to_representation(self, row):
+        pk, user_id, original_text, translated_text, content_type, created_at = row
+        return {
+            'id': pk,
+            'user': user_id,
+            'original_text': original_text,
+            'translated_text': translated_text,
+            'content_type': content_type,
+            'created_at': self.created_at_field.to_representation(created_at),
+        }
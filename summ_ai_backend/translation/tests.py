@@ -1,10 +1,27 @@
+import csv
+import io
+import json
+import os
 import pytest
+import threading
+import time
+from types import SimpleNamespace
 from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 from rest_framework_simplejwt.tokens import RefreshToken
-from translation.models import Translation
+from translation.models import Translation, UsageCounter
 from unittest.mock import patch
-from translation.utils import translate_text, translate_html
+from translation.utils import UntranslatedText, translate_segments, translate_text, translate_html
+from translation.segments import SegmentRetryScheduler, retry_failed_segments
+from translation.serializers import TranslationSerializer, TranslationValuesSerializer, UserSerializer, UserValuesSerializer
+from translation.streaming import iter_values_chunks, stream_json_array
+from translation.fake_upstream import FakeUpstreamConfig, make_fake_upstream
+from translation.loadtest import LoadTest, parse_mix
+from translation.metrics import REGISTRY
 
 
 
@@ -293,3 +310,571 @@ def test_admin_user_list(api_client, get_tokens_for_admin, create_user):
         assert username in returned_usernames
 
 
+@pytest.mark.django_db
+def test_values_serializers_match_model_serializers(create_user):
+    """
+    Test the values fast path serializers.
+    They should produce exactly the same JSON as the model serializers they replace.
+    """
+    user = create_user(username="fastuser", password="fastpassword")
+    Translation.objects.create(user=user, original_text="Grüße ", translated_text="Greetings \"quoted\"", content_type="plain")
+    Translation.objects.create(user=user, original_text="<p>Hallo</p>", translated_text="<p>Hello</p>", content_type="html")
+
+    translations = Translation.objects.order_by('pk')
+    expected = JSONRenderer().render(TranslationSerializer(translations, many=True).data)
+    fast = TranslationValuesSerializer()
+    actual = b''.join(stream_json_array(iter_values_chunks(translations, fast.columns, 1), fast.to_representation))
+    assert actual == expected
+
+    users = User.objects.order_by('pk')
+    expected = JSONRenderer().render(UserSerializer(users, many=True).data)
+    fast = UserValuesSerializer()
+    actual = b''.join(stream_json_array(iter_values_chunks(users, fast.columns, 10), fast.to_representation))
+    assert actual == expected
+
+@pytest.mark.django_db
+@override_settings(FAST_LIST_STREAM_THRESHOLD=2, FAST_LIST_CHUNK_SIZE=2)
+def test_admin_translation_list_streams_large_results(api_client, get_tokens_for_admin, create_user):
+    """
+    Test that the admin translation list streams results above the threshold.
+    The streamed body should contain every translation of the user.
+    """
+    user = create_user(username="streamuser", password="streampassword")
+    for i in range(7):
+        Translation.objects.create(user=user, original_text=f"Text {i}", translated_text=f"Text {i}", content_type="plain")
+
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {get_tokens_for_admin['access']}")
+    response = api_client.get(f'/api/admin/translations/{user.id}/')
+
+    assert response.status_code == 200
+    assert response.streaming
+    data = json.loads(b''.join(response.streaming_content))
+    assert [translation['original_text'] for translation in data] == [f"Text {i}" for i in range(7)]
+
+@pytest.mark.django_db
+def test_admin_translation_export(api_client, get_tokens_for_admin, create_user):
+    """
+    Test the admin export endpoint.
+    It should stream the translations of the requested user as NDJSON or CSV.
+    """
+    user1 = create_user(username="user1", password="password1")
+    user2 = create_user(username="user2", password="password2")
+    Translation.objects.create(user=user1, original_text="Hallo, Welt", translated_text="Hello, world", content_type="plain")
+    Translation.objects.create(user=user1, original_text="Danke", translated_text="Thanks", content_type="plain")
+    Translation.objects.create(user=user2, original_text="Bitte", translated_text="Please", content_type="plain")
+
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {get_tokens_for_admin['access']}")
+    url = '/api/admin/export/translations/'
+
+    response = api_client.get(url, {'user_id': user1.id})
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'application/x-ndjson'
+    lines = b''.join(response.streaming_content).decode().splitlines()
+    assert [json.loads(line)['original_text'] for line in lines] == ["Hallo, Welt", "Danke"]
+
+    response = api_client.get(url, {'export_format': 'csv'})
+    assert response.status_code == 200
+    rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+    assert rows[0] == ['id', 'user', 'original_text', 'translated_text', 'content_type', 'created_at']
+    assert [row[2] for row in rows[1:]] == ["Hallo, Welt", "Danke", "Bitte"]
+
+    response = api_client.get(url, {'until': '2000-01-01'})
+    assert b''.join(response.streaming_content) == b''
+
+    response = api_client.get(url, {'since': 'yesterday'})
+    assert response.status_code == 400
+
+@pytest.mark.django_db
+def test_export_translations_command(create_user):
+    """
+    Test the export_translations management command.
+    It should write one NDJSON line per translation of the selected user.
+    """
+    user = create_user(username="exportuser", password="exportpassword")
+    Translation.objects.create(user=user, original_text="Guten Tag", translated_text="Good day", content_type="plain")
+    Translation.objects.create(user=user, original_text="Tschüss", translated_text="Bye", content_type="plain")
+
+    out = io.StringIO()
+    call_command('export_translations', '--user', str(user.id), '--chunk-size', '1', stdout=out)
+    lines = out.getvalue().splitlines()
+    assert [json.loads(line)['translated_text'] for line in lines] == ["Good day", "Bye"]
+
+@pytest.mark.django_db
+def test_translation_search(api_client, get_tokens_for_user, create_user):
+    """
+    Test the translation search endpoint.
+    It should find the user's own translations by word, phrase and prefix, and follow deletions.
+    """
+    other = create_user(username="otheruser", password="otherpassword")
+    user = User.objects.get(username="testuser")
+    morning = Translation.objects.create(user=user, original_text="Guten Morgen, liebe Freunde", translated_text="Good morning, dear friends", content_type="plain")
+    Translation.objects.create(user=user, original_text="Der Morgen ist schön", translated_text="The morning is beautiful", content_type="plain")
+    Translation.objects.create(user=user, original_text="<p>Freundschaft</p>", translated_text="<p>Friendship</p>", content_type="html")
+    Translation.objects.create(user=other, original_text="Guten Morgen", translated_text="Good morning", content_type="plain")
+
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {get_tokens_for_user['access']}")
+    url = '/api/translations/search/'
+
+    response = api_client.get(url, {'q': 'morning'})
+    assert response.status_code == 200
+    assert response.data['count'] == 2
+
+    response = api_client.get(url, {'q': '"good morning"'})
+    assert [result['id'] for result in response.data['results']] == [morning.id]
+
+    response = api_client.get(url, {'q': 'Freund*'})
+    assert response.data['count'] == 2
+
+    response = api_client.get(url, {'q': '"good morn"*'})
+    assert [result['id'] for result in response.data['results']] == [morning.id]
+
+    response = api_client.get(url, {'q': 'morning', 'page': 2, 'page_size': 1})
+    assert response.data['count'] == 2
+    assert len(response.data['results']) == 1
+
+    # Only updates of the indexed columns rewrite the index entry
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT total_changes()")
+        changes = cursor.fetchone()[0]
+        Translation.objects.filter(pk=morning.pk).update(segment_retries=1)
+        cursor.execute("SELECT total_changes()")
+        assert cursor.fetchone()[0] - changes == 1
+    Translation.objects.filter(pk=morning.pk).update(translated_text="Good morning, dear pals")
+    assert api_client.get(url, {'q': 'friends'}).data['count'] == 0
+    assert [result['id'] for result in api_client.get(url, {'q': 'pals'}).data['results']] == [morning.id]
+
+    # Without FTS5 the search scans with icontains, newest first
+    with patch('translation.search.search_index_available', return_value=False):
+        response = api_client.get(url, {'q': 'morn*'})
+        assert response.data['count'] == 2
+        assert response.data['results'][0]['original_text'] == "Der Morgen ist schön"
+        assert api_client.get(url, {'q': '"good morning"'}).data['count'] == 1
+
+    morning.delete()
+    response = api_client.get(url, {'q': '"good morning"'})
+    assert response.data['count'] == 0
+
+    response = api_client.get(url)
+    assert response.status_code == 400
+
+@pytest.mark.django_db
+def test_usage_counters(api_client, get_tokens_for_user, get_tokens_for_admin):
+    """
+    Test the usage counters and the admin usage endpoint.
+    Creating translations should update the counters, and rebuilding them from history should give the same report.
+    """
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {get_tokens_for_user['access']}")
+    requests = [
+        ("Hallo", "plain", "en-us"),
+        ("Guten Morgen", "plain", "EN-US"),
+        ("<p>Danke</p>", "html", "FR"),
+    ]
+    with patch('translation.views.translate_segments', side_effect=lambda text, content_type, dest_language: (text, [], None)):
+        for original_text, content_type, dest_language in requests:
+            data = {"original_text": original_text, "content_type": content_type, "dest_language": dest_language}
+            assert api_client.post('/api/translate/', data, format='json').status_code == 201
+
+    assert UsageCounter.objects.count() == 2
+
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {get_tokens_for_admin['access']}")
+    user = User.objects.get(username="testuser")
+    response = api_client.get('/api/admin/usage/', {'user_id': user.id})
+    assert response.status_code == 200
+    report = response.data
+    assert report['requests'] == 3
+    assert report['characters'] == len("Hallo") + len("Guten Morgen") + len("<p>Danke</p>")
+    assert {row['dest_language']: row['requests'] for row in report['by_language']} == {"EN-US": 2, "FR": 1}
+    assert {row['content_type']: row['characters'] for row in report['by_content_type']} == {"plain": 17, "html": 12}
+    assert len(report['daily']) == 1
+
+    UsageCounter.objects.all().delete()
+    call_command('rebuild_usage_counters', '--chunk-size', '2', stdout=io.StringIO())
+    assert api_client.get('/api/admin/usage/', {'user_id': user.id}).data == report
+
+    # A translation created while the history is read is counted as well
+    def create_during_scan(queryset, columns, chunk_size):
+        if not Translation.objects.filter(original_text="Tschüss").exists():
+            Translation.objects.create(user=user, original_text="Tschüss", translated_text="Bye", content_type="plain", dest_language="EN-US")
+        return iter_values_chunks(queryset, columns, chunk_size)
+
+    with patch('translation.usage.iter_values_chunks', side_effect=create_during_scan):
+        call_command('rebuild_usage_counters', '--chunk-size', '2', stdout=io.StringIO())
+    assert api_client.get('/api/admin/usage/', {'user_id': user.id}).data['requests'] == 4
+
+    assert api_client.get('/api/admin/usage/', {'since': 'today'}).status_code == 400
+    assert api_client.get('/api/admin/usage/', {'since': '2024-02-30'}).status_code == 400
+    assert api_client.get('/api/admin/usage/', {'until': '2024-13-01'}).status_code == 400
+
+@pytest.mark.django_db
+def test_pretranslate_command(create_user, tmp_path):
+    """
+    Test the pretranslate management command.
+    It should store every valid corpus line once, skip invalid lines and resume from its checkpoint.
+    """
+    user = create_user(username="corpususer", password="corpuspassword")
+    corpus = tmp_path / "corpus.jsonl"
+    lines = [
+        {"original_text": "Hallo", "content_type": "plain"},
+        {"original_text": "<p>Welt</p>", "content_type": "html", "dest_language": "fr"},
+        {"title": "no text"},
+        {"original_text": "Danke", "content_type": "plain"},
+        {"original_text": "Bitte", "content_type": "plain"},
+        {"original_text": ["Hallo"], "content_type": "plain"},
+        {"original_text": "Hallo", "dest_language": 42},
+    ]
+    corpus.write_text('\n'.join(json.dumps(line) for line in lines) + '\nnot json\n')
+    checkpoint = tmp_path / "corpus.checkpoint"
+    checkpoint.write_text(json.dumps({'line': 1}))
+
+    # The forked workers inherit the patch
+    with patch('translation.pretranslate_worker.translate_segments',
+               side_effect=lambda text, content_type, dest_language: (text.upper(), [], None)):
+        options = ['--user', 'corpususer', '--workers', '2', '--batch-size', '2', '--checkpoint', str(checkpoint),
+                   '--start-method', 'fork']
+        call_command('pretranslate', str(corpus), *options, stdout=io.StringIO())
+        call_command('pretranslate', str(corpus), *options, stdout=io.StringIO())
+
+    translations = Translation.objects.filter(user=user).order_by('pk')
+    assert [(t.translated_text, t.dest_language) for t in translations] == [
+        ("<P>WELT</P>", "FR"), ("DANKE", "EN-US"), ("BITTE", "EN-US"),
+    ]
+    assert json.loads(checkpoint.read_text()) == {'line': 8}
+    assert UsageCounter.objects.get(user=user, dest_language="EN-US").requests == 2
+
+
+def fake_upstream_url(server):
+    """Returns the base URL of a fake upstream server."""
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+@pytest.fixture
+def fake_upstream(settings):
+    """Fixture that serves a fast fake translation upstream and points DEEPL_SERVER_URL at it."""
+    server = make_fake_upstream(config=FakeUpstreamConfig(latency_ms=1, latency_sigma=0, per_char_us=0, seed=0))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    settings.DEEPL_SERVER_URL = fake_upstream_url(server)
+    with patch('translation.utils.DEEPL_API_KEY', 'fake-key'):
+        yield server
+    server.shutdown()
+    server.server_close()
+
+def test_fake_upstream_translation(fake_upstream):
+    """
+    Test the translation utilities against the fake upstream.
+    It should translate every chunk and text node through the DeepL client and count the calls.
+    """
+    assert translate_text("Hallo Welt", dest_language='EN-US') == "HALLO WELT"
+    assert translate_html("<div><h1>Hallo</h1><p>Welt</p></div>", dest_language='EN-US') == "<div><h1>HALLO</h1><p>WELT</p></div>"
+    assert fake_upstream.stats.snapshot() == {'calls': 3, 'characters': 19, 'throttled': 0, 'errors': 0}
+
+def test_upstream_retries(fake_upstream):
+    """
+    Test translating against a failing upstream.
+    It should retry the upstream request, count the retries and return the chunk untranslated.
+    """
+    retries = REGISTRY.metrics['translation_upstream_retries_total']
+    errors = REGISTRY.metrics['translation_upstream_calls_total']
+    before = (retries.values.get((), 0), errors.values.get(('error',), 0))
+    fake_upstream.config = FakeUpstreamConfig(latency_ms=0, latency_sigma=0, per_char_us=0, error_rate=1.0, seed=0)
+
+    # No waiting between attempts, and no retries inside the DeepL client
+    no_wait = SimpleNamespace(time=time.time, sleep=lambda seconds: None)
+    with patch('retrying.time', no_wait), patch('deepl.http_client.max_network_retries', 0):
+        translated_text, failed_segments, _ = translate_segments("Hallo Welt", 'plain', dest_language='EN-US')
+
+    assert (translated_text, failed_segments) == ("Hallo Welt", [[0, 0]])
+    assert fake_upstream.stats.snapshot()['errors'] == 3
+    assert (retries.values.get((), 0), errors.values.get(('error',), 0)) == (before[0] + 2, before[1] + 3)
+
+@pytest.mark.django_db
+def test_pretranslate_spawned_workers(fake_upstream, create_user, tmp_path, monkeypatch):
+    """
+    Test the pretranslate command with spawned workers, which set up Django themselves.
+    The workers read the fake upstream from the environment they inherit.
+    """
+    monkeypatch.setenv('DEEPL_SERVER_URL', fake_upstream_url(fake_upstream))
+    monkeypatch.setenv('DEEPL_API_KEY', 'fake-key')
+    user = create_user(username="corpususer", password="corpuspassword")
+    corpus = tmp_path / "corpus.jsonl"
+    corpus.write_text(json.dumps({"original_text": "<p>Hallo</p>", "content_type": "html"}) + '\n')
+
+    call_command('pretranslate', str(corpus), '--user', 'corpususer', '--workers', '1', '--start-method', 'spawn',
+                 '--rate-limit', '10', stdout=io.StringIO())
+    assert Translation.objects.get(user=user).translated_text == "<p>HALLO</p>"
+
+@pytest.mark.django_db(transaction=True)
+def test_load_test_harness(live_server, fake_upstream, create_user):
+    """
+    Test the load test harness against a live server and the fake upstream.
+    It should report every request with latency percentiles and the upstream calls it caused.
+    """
+    create_user(username="loaduser", password="loadpassword")
+
+    # A single client: the live server shares one in-memory SQLite connection between its threads
+    load_test = LoadTest(
+        live_server.url, "loaduser", "loadpassword", concurrency=1,
+        mix=parse_mix("plain=2,html=1,list=1"), upstream_url=fake_upstream_url(fake_upstream), seed=1,
+    )
+    results = load_test.run(requests_count=12)
+
+    assert results['requests'] == 12
+    assert results['errors'] == 0
+    assert results['latency_ms']['p50'] <= results['latency_ms']['p99']
+    assert sum(operation['requests'] for operation in results['by_operation'].values()) == 12
+    assert results['upstream']['calls'] >= results['by_operation']['plain']['requests']
+    json.dumps(results)
+
+def metric_samples(client, **headers):
+    """Returns the samples of the /metrics endpoint as a dict of sample line to value."""
+    response = client.get('/metrics', **headers)
+    assert response.status_code == 200
+    return dict(
+        line.rsplit(' ', 1) for line in response.content.decode().splitlines() if not line.startswith('#')
+    )
+
+@pytest.mark.django_db
+def test_metrics_endpoint(api_client, get_tokens_for_user, fake_upstream, settings, tmp_path):
+    """
+    Test the /metrics endpoint after a translation.
+    It should report the stage histograms and upstream counters, summed with the files of other workers.
+    """
+    settings.METRICS_DIR = str(tmp_path)
+    before = metric_samples(api_client)
+    calls = 'translation_upstream_calls_total{outcome="success"}'
+
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {get_tokens_for_user['access']}")
+    data = {"original_text": "<p>Hallo</p><p>Welt</p>", "content_type": "html", "dest_language": "EN-US"}
+    assert api_client.post('/api/translate/', data, format='json').status_code == 201
+
+    after = metric_samples(api_client)
+    assert int(after[calls]) - int(before.get(calls, 0)) == 2
+    assert int(after['translation_billed_characters_total']) - int(before.get('translation_billed_characters_total', 0)) == 9
+    for stage in ('html_parse', 'html_translate', 'html_rebuild', 'upstream_call', 'db_write'):
+        assert f'translation_stage_duration_seconds_count{{stage="{stage}"}}' in after
+    assert 'translation_request_duration_seconds_bucket{content_type="html",status="201",le="+Inf"}' in after
+
+    # A body that is not a JSON object is an error response, and still counted
+    response = api_client.post('/api/translate/', [1, 2], format='json')
+    assert response.status_code == 500 and 'error' in response.json()
+    assert 'translation_request_duration_seconds_bucket{content_type="invalid",status="500",le="+Inf"}' in metric_samples(api_client)
+
+    # Another worker's values are added to this process' values
+    (tmp_path / f'metrics-{os.getppid()}-1.json').write_text(json.dumps({'translation_upstream_calls_total': [[['success'], 5]]}))
+    assert int(metric_samples(api_client)[calls]) == int(after[calls]) + 5
+
+    # The files of exited workers are folded into one file, and still counted once
+    (tmp_path / 'metrics-999999999-1.json').write_text(json.dumps({'translation_upstream_calls_total': [[['success'], 3]]}))
+    (tmp_path / 'metrics-999999999-2.json').write_text(json.dumps({'translation_upstream_calls_total': [[['success'], 4]]}))
+    assert int(metric_samples(api_client)[calls]) == int(after[calls]) + 12
+    files = sorted(path.name for path in tmp_path.glob('*.json') if path.name != REGISTRY.file_name)
+    assert files == ['exited-workers.json', f'metrics-{os.getppid()}-1.json']
+    assert int(metric_samples(api_client)[calls]) == int(after[calls]) + 12
+
+    # The values of this process are written to its own file
+    REGISTRY.flush()
+    assert (tmp_path / REGISTRY.file_name).exists()
+
+    settings.METRICS_TOKEN = 'secret'
+    api_client.credentials()
+    assert api_client.get('/metrics').status_code == 401
+    assert calls in metric_samples(api_client, HTTP_AUTHORIZATION='Bearer secret')
+
+def slow_translate_segments(text, content_type, dest_language='EN-US'):
+    """Stand-in for translate_segments that takes long enough to be sampled."""
+    time.sleep(0.05)
+    return text, [], None
+
+@pytest.mark.django_db
+@patch('translation.views.translate_segments', slow_translate_segments)
+def test_request_profiling(api_client, get_tokens_for_user, get_tokens_for_admin, settings, tmp_path):
+    """
+    Test profiling requests with the X-Profile header.
+    It should store profiles of admin requests only, keep the newest PROFILING_MAX_PROFILES
+    and expose them on the admin endpoints.
+    """
+    settings.PROFILING_DIR = str(tmp_path)
+    settings.PROFILING_MAX_PROFILES = 2
+    data = {"original_text": "Hallo Welt", "content_type": "plain", "dest_language": "EN-US"}
+
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {get_tokens_for_user['access']}")
+    response = api_client.post('/api/translate/', data, format='json', HTTP_X_PROFILE='1')
+    assert response.status_code == 201
+    assert 'X-Profile-Id' not in response
+
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {get_tokens_for_admin['access']}")
+    profile_ids = []
+    for _ in range(3):
+        response = api_client.post('/api/translate/', data, format='json', HTTP_X_PROFILE='1')
+        assert response.status_code == 201
+        profile_ids.append(response['X-Profile-Id'])
+
+    # Only the newest two are kept
+    response = api_client.get('/api/admin/profiles/')
+    assert [profile['id'] for profile in response.data] == profile_ids[:0:-1]
+    assert response.data[0]['path'] == '/api/translate/'
+    assert response.data[0]['payload_shape']['original_text'] == 'str[16]'
+    assert response.data[0]['payload_shape_hash'] == response.data[1]['payload_shape_hash']
+
+    response = api_client.get(f'/api/admin/profiles/{profile_ids[-1]}/', {'profile_format': 'collapsed'})
+    assert response.status_code == 200
+    assert 'slow_translate_segments (translation/tests.py' in response.content.decode()
+    assert api_client.get(f'/api/admin/profiles/{profile_ids[0]}/').status_code == 404
+
+    # Project code running in other threads, e.g. other requests, is not sampled
+    other_request = threading.Event()
+
+    def unrelated_request():
+        while not other_request.wait(0.001):
+            pass
+
+    def slow_translate_chunk(chunk, dest_language='EN-US'):
+        time.sleep(0.05)
+        return chunk
+
+    thread = threading.Thread(target=unrelated_request)
+    thread.start()
+    try:
+        with patch('translation.views.translate_segments', translate_segments), \
+                patch('translation.utils.translate_chunk', slow_translate_chunk):
+            response = api_client.post('/api/translate/', {**data, "content_type": "html", "original_text": "<p>Hallo</p>"},
+                                       format='json', HTTP_X_PROFILE='1')
+    finally:
+        other_request.set()
+        thread.join()
+    profile = api_client.get(f"/api/admin/profiles/{response['X-Profile-Id']}/", {'profile_format': 'collapsed'}).content.decode()
+    # The chunk is translated in an executor thread started by an executor thread of the request
+    assert any(stack.startswith('ThreadPoolExecutor;') and 'slow_translate_chunk' in stack for stack in profile.splitlines())
+    assert 'unrelated_request' not in profile
+
+    # The sampler stops when the view raises
+    with patch('translation.views.TranslationCreateView.post', side_effect=RuntimeError):
+        with pytest.raises(RuntimeError):
+            api_client.post('/api/translate/', data, format='json', HTTP_X_PROFILE='1')
+    assert not any(thread.name == 'profiling-sampler' for thread in threading.enumerate())
+
+    # A body over DATA_UPLOAD_MAX_MEMORY_SIZE is profiled without its shape
+    settings.DATA_UPLOAD_MAX_MEMORY_SIZE = 1000
+    data = {"original_text": "Hallo " * 500, "content_type": "plain", "dest_language": "EN-US"}
+    response = api_client.post('/api/translate/', data, format='json', HTTP_X_PROFILE='1')
+    assert response.status_code == 201
+    assert api_client.get(f"/api/admin/profiles/{response['X-Profile-Id']}/").data['payload_shape'] is None
+
+@pytest.mark.django_db
+def test_failed_segment_retry(api_client, get_tokens_for_user, settings):
+    """
+    Test retrying the segments the upstream failed to translate.
+    It should store the failed segments, send only those upstream again and patch the translation in place.
+    """
+    settings.SEGMENT_RETRY_DELAY = 0
+    sent = []
+    outage = {'Welt', 'zwei ' * 199 + 'zwei'}
+
+    def fake_translate_chunk(chunk, dest_language='EN-US'):
+        sent.append(chunk)
+        return UntranslatedText(chunk) if chunk in outage else chunk.upper()
+
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {get_tokens_for_user['access']}")
+    requests = [
+        ("<div><h1>Hallo</h1><p>Welt</p></div>", "html"),
+        ("eins " * 200 + "zwei " * 200, "plain"),
+    ]
+    with patch('translation.utils.translate_chunk', fake_translate_chunk):
+        for original_text, content_type in requests:
+            data = {"original_text": original_text, "content_type": content_type, "dest_language": "EN-US"}
+            assert api_client.post('/api/translate/', data, format='json').status_code == 201
+        html, plain = Translation.objects.order_by('pk')
+        assert html.translated_text == "<div><h1>HALLO</h1><p>Welt</p></div>"
+        assert html.failed_segments == [[1, 0]]
+        assert plain.translated_text == ("EINS " * 200 + "zwei " * 200).strip()
+        assert plain.failed_segments == [[0, 1]]
+
+        # Still failing: the segments stay failed and are counted as retried
+        sent.clear()
+        assert retry_failed_segments(Translation.objects.get(pk=html.pk)) == 1
+        assert sent == ['Welt']
+
+        outage.clear()
+        sent.clear()
+        output = io.StringIO()
+        call_command('retry_failed_segments', stdout=output)
+
+    assert sorted(sent) == sorted(['Welt', 'zwei ' * 199 + 'zwei'])
+    assert 'Retried 2 translations: 2 segments repaired, 0 still failed.' in output.getvalue()
+    html.refresh_from_db()
+    plain.refresh_from_db()
+    assert html.translated_text == "<div><h1>HALLO</h1><p>WELT</p></div>"
+    assert plain.translated_text == ("EINS " * 200 + "ZWEI " * 200).strip()
+    assert (html.failed_segments, html.segments, html.segment_retries) == ([], None, 2)
+    assert (plain.failed_segments, plain.segments, plain.segment_retries) == ([], None, 1)
+
+    # A retry that lost the race to another one does not overwrite its result
+    stale = Translation(pk=plain.pk, original_text="x", content_type="plain", dest_language="EN-US",
+                        failed_segments=[[0, 0]], segments=[["x"]], segment_retries=0)
+    with patch('translation.utils.translate_chunk', fake_translate_chunk):
+        assert retry_failed_segments(stale) is None
+    plain.refresh_from_db()
+    assert plain.translated_text == ("EINS " * 200 + "ZWEI " * 200).strip()
+
+    # A text node that fails as a whole is split into segments like a translated one
+    with patch('translation.utils.translate_text_chunks', side_effect=RuntimeError):
+        html = "<p>" + "Wort " * 450 + "</p>"
+        translated_text, failed_segments, segments = translate_segments(html, 'html', 'EN-US')
+    assert failed_segments == [[0, 0], [0, 1], [0, 2]]
+    assert [len(chunk.split()) for chunk in segments[0]] == [200, 200, 50]
+
+@pytest.mark.django_db(transaction=True)
+def test_segment_retry_scheduler(create_user, settings):
+    """
+    Test retrying failed segments in the background.
+    It should retry with a doubling delay, stop after SEGMENT_RETRY_MAX_ATTEMPTS retries,
+    leave translations patched by another retry alone and stop with its thread.
+    """
+    settings.SEGMENT_RETRY_DELAY = 0.05
+    settings.SEGMENT_RETRY_MAX_ATTEMPTS = 3
+    user = create_user(username="retryuser", password="retrypassword")
+    attempts = {}
+
+    def create(text):
+        return Translation.objects.create(user=user, original_text=text, translated_text=text, content_type="plain",
+                                          dest_language="EN-US", failed_segments=[[0, 0]], segments=[[text]])
+
+    outage, recovers, patched_meanwhile = create("ausfall"), create("erholt"), create("parallel")
+
+    def fake_translate_chunk(chunk, dest_language='EN-US'):
+        attempts.setdefault(chunk, []).append(time.monotonic())
+        if chunk == "parallel":
+            # Another retry patches the translation while this one runs
+            Translation.objects.filter(pk=patched_meanwhile.pk).update(segment_retries=5)
+        if chunk == "ausfall" or (chunk == "erholt" and len(attempts[chunk]) < 2):
+            return UntranslatedText(chunk)
+        return chunk.upper()
+
+    scheduler = SegmentRetryScheduler()
+    with patch('translation.utils.translate_chunk', fake_translate_chunk):
+        started = time.monotonic()
+        for translation in (outage, recovers, patched_meanwhile):
+            scheduler.schedule(translation.pk)
+        deadline = time.monotonic() + 5
+        while len(attempts.get("ausfall", [])) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.1)
+        scheduler.stop()
+    assert not scheduler.thread.is_alive()
+
+    # Retried after 0.05s, 0.1s and 0.2s, then given up
+    times = [started] + attempts["ausfall"]
+    assert len(times) == 4
+    assert [round(later - earlier, 2) >= 0.05 * 2 ** index for index, (earlier, later) in enumerate(zip(times, times[1:]))] == [True] * 3
+    outage.refresh_from_db()
+    assert (outage.failed_segments, outage.segment_retries) == ([[0, 0]], 3)
+
+    recovers.refresh_from_db()
+    assert (recovers.translated_text, recovers.failed_segments, recovers.segments, recovers.segment_retries) == ("ERHOLT", [], None, 2)
+
+    patched_meanwhile.refresh_from_db()
+    assert len(attempts["parallel"]) == 1
+    assert (patched_meanwhile.translated_text, patched_meanwhile.segment_retries) == ("parallel", 5)
+
+    # Retries scheduled after stopping are ignored
+    scheduler.schedule(outage.pk)
+    assert scheduler.queue == []
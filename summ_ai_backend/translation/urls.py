@@ -1,7 +1,8 @@
-from .views import documentation_view
+from .views import documentation_view, metrics_view
 from django.urls import path
 
-# URL patterns define the routing for the landing page.
+# URL patterns define the routing for the landing page and the metrics endpoint.
 urlpatterns = [
     path('', documentation_view, name='documentation'),
+    path('metrics', metrics_view, name='metrics'),
 ]
\ No newline at end of file
@@ -0,0 +1,119 @@
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max, Sum
+from django.db.models.functions import Length
+from django.utils import timezone
+
+from .models import Translation, UsageCounter
+from .streaming import iter_values_chunks
+
+
+def record_usage(user_id, day, dest_language, content_type, characters, requests=1):
+    """
+    Adds translation requests to the usage counter of a user.
+
+    Args:
+        user_id (int): The user who requested the translation.
+        day (date): The day the translation was created.
+        dest_language (str): The target language of the translation.
+        content_type (str): 'plain' or 'html'.
+        characters (int): The number of characters sent for translation.
+        requests (int): The number of translation requests to add.
+    """
+    key = {'user_id': user_id, 'day': day, 'dest_language': dest_language, 'content_type': content_type}
+    increment = {'requests': F('requests') + requests, 'characters': F('characters') + characters}
+    if UsageCounter.objects.filter(**key).update(**increment):
+        return
+    try:
+        with transaction.atomic():
+            UsageCounter.objects.create(**key, requests=requests, characters=characters)
+    except IntegrityError:
+        # Another request created the counter in the meantime
+        UsageCounter.objects.filter(**key).update(**increment)
+
+
+def usage_report(user_id=None, since=None, until=None):
+    """
+    Summarizes usage from the counters, without reading the Translation table.
+
+    Args:
+        user_id (int): Only report usage of this user, if given.
+        since (date): First day to include, if given.
+        until (date): Last day to include, if given.
+
+    Returns:
+        dict: Totals, and requests and characters per user, content type, language and day.
+    """
+    counters = UsageCounter.objects.all()
+    if user_id is not None:
+        counters = counters.filter(user_id=user_id)
+    if since is not None:
+        counters = counters.filter(day__gte=since)
+    if until is not None:
+        counters = counters.filter(day__lte=until)
+
+    def grouped(field):
+        rows = counters.values(field).annotate(total_requests=Sum('requests'), total_characters=Sum('characters'))
+        return [
+            {field: row[field], 'requests': row['total_requests'], 'characters': row['total_characters']}
+            for row in rows.order_by(field)
+        ]
+
+    totals = counters.aggregate(total_requests=Sum('requests'), total_characters=Sum('characters'))
+    return {
+        'requests': totals['total_requests'] or 0,
+        'characters': totals['total_characters'] or 0,
+        'by_user': grouped('user_id'),
+        'by_content_type': grouped('content_type'),
+        'by_language': grouped('dest_language'),
+        'daily': grouped('day'),
+    }
+
+
+def rebuild_usage_counters(chunk_size):
+    """
+    Recomputes all usage counters from the stored translations.
+
+    Translations are read `chunk_size` rows at a time and only the per-counter totals
+    are kept in memory. The history up to the newest translation at the start is read
+    outside a transaction, as a long read transaction on SQLite would block every
+    translation request. The counters are then replaced in a short transaction that
+    also counts the translations created in the meantime.
+
+    Args:
+        chunk_size (int): The number of translations fetched per database query.
+
+    Returns:
+        int: The number of counters written.
+    """
+    totals = defaultdict(lambda: [0, 0])
+    translations = Translation.objects.annotate(characters=Length('original_text'))
+    columns = ('id', 'user_id', 'created_at', 'dest_language', 'content_type', 'characters')
+
+    def count(queryset):
+        for rows in iter_values_chunks(queryset, columns, chunk_size):
+            for _, user_id, created_at, dest_language, content_type, characters in rows:
+                counter = totals[(user_id, timezone.localdate(created_at), dest_language, content_type)]
+                counter[0] += 1
+                counter[1] += characters
+
+    max_pk = Translation.objects.aggregate(max_pk=Max('pk'))['max_pk'] or 0
+    count(translations.filter(pk__lte=max_pk))
+
+    with transaction.atomic():
+        # Writing first takes the write lock, so no translation is created between
+        # counting the newer ones and replacing the counters
+        UsageCounter.objects.all().delete()
+        count(translations.filter(pk__gt=max_pk))
+        UsageCounter.objects.bulk_create(
+            (
+                UsageCounter(
+                    user_id=user_id, day=day, dest_language=dest_language, content_type=content_type,
+                    requests=requests, characters=characters,
+                )
+                for (user_id, day, dest_language, content_type), (requests, characters) in totals.items()
+            ),
+            batch_size=chunk_size,
+        )
+    return len(totals)
@@ -1,18 +1,78 @@
 import os
-import deepl
-from bs4 import BeautifulSoup, NavigableString
-from concurrent.futures import ThreadPoolExecutor
 import logging
 from retrying import retry
+from django.conf import settings
+from .metrics import BILLED_CHARACTERS, FALLBACKS, STAGE_SECONDS, UPSTREAM_CALLS, UPSTREAM_RETRIES
+from .profiling import ProfiledThreadPoolExecutor
 
 # Get the DeepL API key from the environment variable
 DEEPL_API_KEY = os.environ.get("DEEPL_API_KEY")
 
+# deepl and bs4 are imported by the functions using them, so that starting a server
+# worker does not pay for them before the first translation.
+
 # Initialize the logger
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-@retry(stop_max_attempt_number=3, wait_fixed=2000)
+# Optional limiter with an `acquire()` method, called before every upstream request.
+# Set with `set_upstream_rate_limiter`, e.g. by the bulk pre-translation workers.
+upstream_rate_limiter = None
+
+def set_upstream_rate_limiter(limiter):
+    """
+    Sets the limiter that call_upstream waits on before calling the DeepL API.
+
+    Args:
+        limiter: An object with an `acquire()` method, or None to disable rate limiting.
+    """
+    global upstream_rate_limiter
+    upstream_rate_limiter = limiter
+
+class UntranslatedText(str):
+    """
+    The original text of a segment that could not be translated, returned in place of its
+    translation so the document stays complete and the segment can be retried later.
+    """
+
+def count_retry(attempt_number):
+    """
+    Counts the attempts of call_upstream after the first one.
+    """
+    if attempt_number > 1:
+        UPSTREAM_RETRIES.inc()
+
+@retry(stop_max_attempt_number=3, wait_fixed=2000, before_attempts=count_retry)
+def call_upstream(chunk, dest_language='EN-US'):
+    """
+    Sends a chunk of text to the DeepL API, retrying up to 3 times in case of failure.
+    
+    Args:
+        chunk (str): The text chunk to translate.
+        dest_language (str): The target language for translation.
+    
+    Returns:
+        str: The translated text.
+    
+    Raises:
+        Exception: The error of the last attempt, if every attempt failed.
+    """
+    import deepl
+
+    if upstream_rate_limiter is not None:
+        with STAGE_SECONDS.time(stage='rate_limit_wait'):
+            upstream_rate_limiter.acquire()
+    try:
+        translator = deepl.Translator(DEEPL_API_KEY, server_url=settings.DEEPL_SERVER_URL)
+        with STAGE_SECONDS.time(stage='upstream_call'):
+            translation = translator.translate_text(chunk, target_lang=dest_language.upper())
+    except Exception:
+        UPSTREAM_CALLS.inc(outcome='error')
+        raise
+    UPSTREAM_CALLS.inc(outcome='success')
+    BILLED_CHARACTERS.inc(len(chunk))
+    return translation.text
+
 def translate_chunk(chunk, dest_language='EN-US'):
     """
     Translates a chunk of text into the specified language using DeepL API.
@@ -22,17 +82,14 @@ def translate_chunk(chunk, dest_language='EN-US'):
         dest_language (str): The target language for translation.
     
     Returns:
-        str: The translated text, or the original chunk if an error occurs.
-    
-    Retries the translation up to 3 times in case of failure.
+        str: The translated text, or the original chunk as UntranslatedText if every attempt failed.
     """
-    translator = deepl.Translator(DEEPL_API_KEY)
     try:
-        translation = translator.translate_text(chunk, target_lang=dest_language.upper())
-        return translation.text
+        return call_upstream(chunk, dest_language)
     except Exception as e:
         logger.error(f"Error during translation: {e}")
-        return chunk
+        FALLBACKS.inc(level='chunk')
+        return UntranslatedText(chunk)
 
 def chunk_text_by_tokens(text, tokens_per_chunk=200):
     """
@@ -49,6 +106,23 @@ def chunk_text_by_tokens(text, tokens_per_chunk=200):
     chunks = [' '.join(words[i:i + tokens_per_chunk]) for i in range(0, len(words), tokens_per_chunk)]
     return chunks
 
+def translate_text_chunks(text, dest_language='EN-US'):
+    """
+    Translates a large body of text by splitting it into chunks and translating each chunk.
+    
+    Args:
+        text (str): The text to translate.
+        dest_language (str): The target language for translation.
+    
+    Returns:
+        list: The translated chunks; chunks that could not be translated are UntranslatedText.
+    """
+    with STAGE_SECONDS.time(stage='text_chunk'):
+        chunks = chunk_text_by_tokens(text)
+    with STAGE_SECONDS.time(stage='text_translate'):
+        with ProfiledThreadPoolExecutor() as executor:
+            return list(executor.map(lambda chunk: translate_chunk(chunk, dest_language), chunks))
+
 def translate_text(text, dest_language='EN-US'):
     """
     Translates a large body of text by splitting it into chunks and translating each chunk.
@@ -60,10 +134,7 @@ def translate_text(text, dest_language='EN-US'):
     Returns:
         str: The translated text, recombined from translated chunks.
     """
-    chunks = chunk_text_by_tokens(text)
-    with ThreadPoolExecutor() as executor:
-        translated_chunks = list(executor.map(lambda chunk: translate_chunk(chunk, dest_language), chunks))
-    return ' '.join(translated_chunks)
+    return ' '.join(translate_text_chunks(text, dest_language))
 
 def translate_text_node(node, dest_language='EN-US'):
     """
@@ -74,18 +145,95 @@ def translate_text_node(node, dest_language='EN-US'):
         dest_language (str): The target language for translation.
     
     Returns:
-        str: The translated text, or the original node if an error occurs.
+        list: The translated chunks of the node, or its chunks as UntranslatedText if an error occurs.
     
     Handles translation errors gracefully, logging them and returning the original text.
     """
     try:
         if node.strip():
-            translated_text = translate_text(node, dest_language)
-            return translated_text
-        return node
+            return translate_text_chunks(node, dest_language)
+        return [node]
     except Exception as e:
         logger.error(f"Error translating node: {e}")
-        return node
+        FALLBACKS.inc(level='node')
+        # Chunked like a translated node, so each chunk is retried as its own segment
+        return [UntranslatedText(chunk) for chunk in chunk_text_by_tokens(node)]
+
+def extract_text_nodes(soup):
+    """
+    Collects the text nodes of a parsed HTML document that contain translatable text.
+    
+    Args:
+        soup (BeautifulSoup): The parsed HTML document.
+    
+    Returns:
+        list: The non-blank NavigableString nodes, in document order.
+    """
+    from bs4 import NavigableString
+
+    return [node for node in soup.find_all(string=True) if isinstance(node, NavigableString) and node.strip()]
+
+def replace_text_nodes(text_nodes, translated_texts):
+    """
+    Replaces text nodes in place with their translations.
+    
+    Args:
+        text_nodes (list): The nodes returned by `extract_text_nodes`.
+        translated_texts (list): The translated text of every node, in the same order.
+    """
+    for original, translated in zip(text_nodes, translated_texts):
+        original.replace_with(f'{translated.strip()} ')
+
+def normalize_html(html):
+    """
+    Normalizes serialized HTML for consistent output.
+    
+    Args:
+        html (str): The serialized HTML document.
+    
+    Returns:
+        str: The HTML with double quotes replaced by single quotes and the spaces left
+        before closing brackets and closing tags by `replace_text_nodes` removed.
+    """
+    return html.replace('"', "'").replace(" >", ">").replace(" </", "</")
+
+def translate_html_nodes(html, dest_language='EN-US'):
+    """
+    Parses an HTML document and translates each of its text nodes.
+    
+    Args:
+        html (str): The HTML content to translate.
+        dest_language (str): The target language for translation.
+    
+    Returns:
+        tuple: The parsed document, its text nodes and the translated chunks of every node.
+    """
+    from bs4 import BeautifulSoup
+
+    with STAGE_SECONDS.time(stage='html_parse'):
+        soup = BeautifulSoup(html, 'html.parser')
+        text_nodes = extract_text_nodes(soup)
+
+    with STAGE_SECONDS.time(stage='html_translate'):
+        with ProfiledThreadPoolExecutor() as executor:
+            node_chunks = list(executor.map(lambda node: translate_text_node(node, dest_language), text_nodes))
+    return soup, text_nodes, node_chunks
+
+def render_html(soup, text_nodes, node_chunks):
+    """
+    Replaces the text nodes of a parsed document with their translated chunks and serializes it.
+    
+    Args:
+        soup (BeautifulSoup): The parsed HTML document.
+        text_nodes (list): The nodes returned by `extract_text_nodes`.
+        node_chunks (list): The translated chunks of every node, in the same order.
+    
+    Returns:
+        str: The translated HTML document.
+    """
+    with STAGE_SECONDS.time(stage='html_rebuild'):
+        replace_text_nodes(text_nodes, [' '.join(chunks) for chunks in node_chunks])
+        return normalize_html(str(soup))
 
 def translate_html(html, dest_language='EN-US'):
     """
@@ -101,16 +249,72 @@ def translate_html(html, dest_language='EN-US'):
     Translates only the inner text of tags and preserves the HTML structure.
     Replaces double quotes with single quotes in the final HTML output for consistency.
     """
-    soup = BeautifulSoup(html, 'html.parser')
-    text_nodes = [node for node in soup.find_all(string=True) if isinstance(node, NavigableString) and node.strip()]
+    return render_html(*translate_html_nodes(html, dest_language))
+
+def retranslate_segments(sources, dest_language='EN-US'):
+    """
+    Translates segments that failed before, sending each one upstream again as a single chunk.
+    
+    Args:
+        sources (list): The original text of the segments.
+        dest_language (str): The target language for translation.
+    
+    Returns:
+        list: The translated segments; segments that failed again are UntranslatedText.
+    """
+    def retranslate(source):
+        try:
+            return translate_chunk(source, dest_language)
+        except Exception as e:
+            logger.error(f"Error retranslating segment: {e}")
+            return UntranslatedText(source)
 
-    with ThreadPoolExecutor() as executor:
-        translated_texts = list(executor.map(lambda node: translate_text_node(node, dest_language), text_nodes))
+    with ProfiledThreadPoolExecutor() as executor:
+        return list(executor.map(retranslate, sources))
 
-    for original, translated in zip(text_nodes, translated_texts):
-        original.replace_with(f'{translated.strip()} ')
+def translate_segments(original_text, content_type, dest_language='EN-US'):
+    """
+    Translates plain text or HTML and reports the segments that could not be translated.
+    A segment is one chunk of one text node; plain text is a single text node.
+    
+    Args:
+        original_text (str): The text or HTML to translate.
+        content_type (str): 'plain' or 'html'.
+        dest_language (str): The target language for translation.
+    
+    Returns:
+        tuple: The translated text, the [node, chunk] indexes of the untranslated segments
+        and the translated chunks of every node, from which `render_segments` rebuilds the text.
+    """
+    if content_type == 'html':
+        soup, text_nodes, segments = translate_html_nodes(original_text, dest_language)
+        translated_text = render_html(soup, text_nodes, segments)
+    else:
+        segments = [translate_text_chunks(original_text, dest_language)]
+        translated_text = ' '.join(segments[0])
+    failed_segments = [
+        [node, chunk]
+        for node, chunks in enumerate(segments)
+        for chunk, text in enumerate(chunks)
+        if isinstance(text, UntranslatedText)
+    ]
+    return translated_text, failed_segments, segments
 
-    translated_html = str(soup)
-    translated_html = translated_html.replace('"', "'").replace(" >", ">").replace(" </", "</")
+def render_segments(original_text, content_type, segments):
+    """
+    Rebuilds the translated text from the translated chunks of every node, without calling the upstream.
+    
+    Args:
+        original_text (str): The text or HTML that was translated.
+        content_type (str): 'plain' or 'html'.
+        segments (list): The translated chunks of every node, as returned by `translate_segments`.
+    
+    Returns:
+        str: The translated text.
+    """
+    if content_type == 'html':
+        from bs4 import BeautifulSoup
 
-    return translated_html
+        soup = BeautifulSoup(original_text, 'html.parser')
+        return render_html(soup, extract_text_nodes(soup), segments)
+    return ' '.join(segments[0])
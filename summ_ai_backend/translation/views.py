@@ -5,9 +5,25 @@ from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from .models import Translation
-from .serializers import TranslationSerializer
-from .utils import translate_text, translate_html
+from .serializers import TranslationSerializer, TranslationValuesSerializer, UserValuesSerializer
+from .streaming import ChunkedStreamingHttpResponse, fast_list_response
+from .export import EXPORT_CONTENT_TYPES, EXPORT_FORMATS, export_queryset, parse_export_bound, stream_export
+from .search import search_translations
+from .usage import record_usage, usage_report
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.conf import settings
+from .utils import translate_segments
+from .segments import schedule_segment_retry
+from .metrics import REQUEST_SECONDS, STAGE_SECONDS, render_metrics
+from .profiling import collapsed_stacks, list_profiles, load_profile
+from django.http import HttpResponse
 from django.shortcuts import render
+import logging
+import time
+
+logger = logging.getLogger(__name__)
 
 def documentation_view(request):
     """ 
@@ -21,6 +37,21 @@ def documentation_view(request):
     """
     return render(request, 'index.html')
 
+def metrics_view(request):
+    """
+    Exposes the translation metrics of all workers in the Prometheus text format.
+    If METRICS_TOKEN is set, the request must send it as a bearer token.
+
+    Args:
+        request: The HTTP request object.
+
+    Returns:
+        HttpResponse: The metrics, or 401 if the token is missing or wrong.
+    """
+    if settings.METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {settings.METRICS_TOKEN}':
+        return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 class RegisterView(generics.CreateAPIView):
     """ 
     View for registering a new user. Allows any visitor to create a user account.
@@ -59,6 +90,21 @@ class TranslationCreateView(APIView):
         Returns:
             Response: Serialized data of the created translation or error message.
         """
+        start = time.perf_counter()
+        response = self.translate(request)
+        # The body may be any JSON value; translate() reports those errors
+        content_type = request.data.get('content_type') if isinstance(request.data, dict) else None
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            content_type=content_type if content_type in ('plain', 'html') else 'invalid',
+            status=response.status_code
+        )
+        return response
+
+    def translate(self, request):
+        """
+        Validates the request, translates the text and stores the translation.
+        """
         try:
             original_text = request.data.get('original_text')
             content_type = request.data.get('content_type')
@@ -74,26 +120,40 @@ class TranslationCreateView(APIView):
             if not dest_language:
                 return Response({"error": "dest_language is required."}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Process translation based on content type
-            if content_type == 'html':
-                translated_text = translate_html(original_text, dest_language)
-                print(f'Translated HTML: {translated_text}')
-            else:
-                translated_text = translate_text(original_text, dest_language)
-                print(f'Translated Text: {translated_text}')
-
-            # Create and return the translation model instance
-            translation = Translation.objects.create(
-                user=request.user,
-                original_text=original_text,
-                translated_text=translated_text,
-                content_type=content_type
-            )
+            # Process translation based on content type. Segments the upstream failed to translate
+            # keep their original text and are retried in the background.
+            translated_text, failed_segments, segments = translate_segments(original_text, content_type, dest_language)
+            logger.debug(f'Translated {content_type} text: {translated_text}')
+
+            # Count the translation towards the user's usage and create the model instance.
+            # The counter is written first so the transaction takes the SQLite write lock
+            # before the insert fires the search index trigger, which would fail with
+            # "database is locked" under concurrent writes instead of waiting.
+            dest_language = dest_language.upper()
+            with STAGE_SECONDS.time(stage='db_write'), transaction.atomic():
+                record_usage(
+                    user_id=request.user.id,
+                    day=timezone.localdate(),
+                    dest_language=dest_language,
+                    content_type=content_type,
+                    characters=len(original_text)
+                )
+                translation = Translation.objects.create(
+                    user=request.user,
+                    original_text=original_text,
+                    translated_text=translated_text,
+                    content_type=content_type,
+                    dest_language=dest_language,
+                    failed_segments=failed_segments,
+                    segments=segments if failed_segments else None
+                )
+            if failed_segments:
+                schedule_segment_retry(translation.id)
             serializer = TranslationSerializer(translation)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         except Exception as e:
-            print(f"Error: {e}")  
+            logger.exception(f"Error: {e}")
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 class AdminTranslationListView(APIView):
@@ -118,8 +178,7 @@ class AdminTranslationListView(APIView):
         try:
             user = User.objects.get(id=user_id)
             translations = Translation.objects.filter(user=user)
-            serializer = TranslationSerializer(translations, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return fast_list_response(request, translations, TranslationValuesSerializer())
         except User.DoesNotExist:
             return Response({"error": "User not found."}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
@@ -148,12 +207,182 @@ class AdminUserListView(APIView):
         """
         try:
             users = User.objects.all()
-            serializer = UserSerializer(users, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return fast_list_response(request, users, UserValuesSerializer())
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class AdminTranslationExportView(APIView):
+    """
+    View to export translations as NDJSON or CSV, accessible only by admin users.
+    The export is streamed, so it can cover any number of translations.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        """
+        Streams the translations matching the query parameters.
+
+        Args:
+            request: The HTTP request object with optional 'export_format' ('ndjson' or 'csv'),
+                'user_id', 'since' and 'until' query parameters.
+            args: Additional arguments.
+            kwargs: Keyword arguments.
+
+        Returns:
+            StreamingHttpResponse: The export file or an error message.
+        """
+        export_format = request.query_params.get('export_format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return Response({"error": "export_format must be 'ndjson' or 'csv'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        user_id = request.query_params.get('user_id')
+        if user_id is not None:
+            if not user_id.isdigit():
+                return Response({"error": "user_id must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+            if not User.objects.filter(id=user_id).exists():
+                return Response({"error": "User not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            since = parse_export_bound(request.query_params.get('since'))
+            until = parse_export_bound(request.query_params.get('until'), end_of_day=True)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        translations = export_queryset(user_id=user_id, since=since, until=until)
+        content = stream_export(translations, export_format, settings.EXPORT_CHUNK_SIZE)
+        response = ChunkedStreamingHttpResponse(content, content_type=EXPORT_CONTENT_TYPES[export_format])
+        response['Content-Disposition'] = f'attachment; filename="translations.{export_format}"'
+        return response
+
+
+class AdminUsageView(APIView):
+    """
+    View to report translation usage from the usage counters, accessible only by admin users.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        """
+        Reports requests and characters per user, content type, language and day.
+
+        Args:
+            request: The HTTP request object with optional 'user_id', 'since' and 'until'
+                (YYYY-MM-DD, inclusive) query parameters.
+            args: Additional arguments.
+            kwargs: Keyword arguments.
+
+        Returns:
+            Response: The usage report or an error message.
+        """
+        user_id = request.query_params.get('user_id')
+        if user_id is not None and not user_id.isdigit():
+            return Response({"error": "user_id must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        bounds = {}
+        for name in ('since', 'until'):
+            value = request.query_params.get(name)
+            try:
+                bounds[name] = parse_date(value) if value else None
+            except ValueError:
+                # Well formed but impossible, e.g. 2024-02-30
+                bounds[name] = None
+            if value and bounds[name] is None:
+                return Response({"error": f"{name} must be a date (YYYY-MM-DD)."}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = usage_report(user_id=user_id, since=bounds['since'], until=bounds['until'])
+        return Response(report, status=status.HTTP_200_OK)
+
+
+class AdminProfileListView(APIView):
+    """
+    View to list the stored request profiles, accessible only by admin users.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        """
+        Lists the stored profiles, newest first, without their stacks.
+
+        Args:
+            request: The HTTP request object.
+            args: Additional arguments.
+            kwargs: Keyword arguments.
+
+        Returns:
+            Response: The profile summaries.
+        """
+        return Response(list_profiles(), status=status.HTTP_200_OK)
+
+
+class AdminProfileDetailView(APIView):
+    """
+    View to retrieve one stored request profile, accessible only by admin users.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, profile_id, *args, **kwargs):
+        """
+        Retrieves a profile with its sampled stacks.
+
+        Args:
+            request: The HTTP request object with the optional 'profile_format' query parameter:
+                'json' (default) or 'collapsed' for the stacks in the format of flamegraph.pl and speedscope.
+            profile_id: The id of the profile, as returned in the X-Profile-Id response header.
+            args: Additional arguments.
+            kwargs: Keyword arguments.
+
+        Returns:
+            Response: The profile or an error message.
+        """
+        profile = load_profile(profile_id)
+        if profile is None:
+            return Response({"error": "Profile not found."}, status=status.HTTP_404_NOT_FOUND)
+        if request.query_params.get('profile_format') == 'collapsed':
+            return HttpResponse(collapsed_stacks(profile), content_type='text/plain; charset=utf-8')
+        return Response(profile, status=status.HTTP_200_OK)
+
+
+class TranslationSearchView(APIView):
+    """
+    View to search the translations of the authenticated user by word, phrase or prefix.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        """
+        Returns one page of the user's translations matching the query, best matches first.
+
+        Args:
+            request: The HTTP request object with the 'q' query parameter and optional
+                'page' and 'page_size' parameters.
+            args: Additional arguments.
+            kwargs: Keyword arguments.
+
+        Returns:
+            Response: The number of matches and the serialized translations of the page, or an error message.
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"error": "q is required."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            page = int(request.query_params.get('page', 1))
+            page_size = int(request.query_params.get('page_size', settings.SEARCH_PAGE_SIZE))
+        except ValueError:
+            return Response({"error": "page and page_size must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+        if page < 1 or not 1 <= page_size <= settings.SEARCH_MAX_PAGE_SIZE:
+            return Response(
+                {"error": f"page must be positive and page_size between 1 and {settings.SEARCH_MAX_PAGE_SIZE}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        count, ids = search_translations(request.user, query, limit=page_size, offset=(page - 1) * page_size)
+        serializer = TranslationValuesSerializer()
+        rows = {row[0]: row for row in Translation.objects.filter(id__in=ids).values_list(*serializer.columns)}
+        results = [serializer.to_representation(rows[pk]) for pk in ids if pk in rows]
+        return Response({"count": count, "page": page, "page_size": page_size, "results": results}, status=status.HTTP_200_OK)
+
+
 class TranslationListView(generics.ListAPIView):
     """
     View to list all translations associated with the authenticated user.
@@ -169,6 +398,15 @@ class TranslationListView(generics.ListAPIView):
             QuerySet: A queryset of Translation objects for the authenticated user.
         """
         return Translation.objects.filter(user=self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        """
+        Lists the user's translations through the values fast path.
+
+        Returns:
+            Response: Serialized translations, streamed for large results.
+        """
+        return fast_list_response(request, self.get_queryset(), TranslationValuesSerializer())
     
 class UserDetailView(generics.RetrieveAPIView):
     """
@@ -0,0 +1,120 @@
+import random
+
+# German vocabulary used to generate realistic-looking source documents
+WORDS = (
+    'der die das und ist nicht ein eine zu mit auf für von den im dem sich es auch wir sie '
+    'haben werden kann muss heute morgen immer wieder sehr gut neue alten großen kleinen '
+    'Stadt Haus Arbeit Zeit Jahr Woche Menschen Kinder Schule Regierung Unternehmen Bericht '
+    'Wasser Straße Bahnhof Sprache Übersetzung Vertrag Kunden Anfrage Ergebnis Beispiel '
+    'schreiben lesen verstehen erklären helfen bringen zeigen finden bleiben arbeiten '
+    'einfach wichtig schnell langsam bereits zusammen später deshalb jedoch außerdem'
+).split()
+
+BLOCK_TAGS = ('div', 'section', 'article', 'ul', 'blockquote')
+TEXT_TAGS = ('p', 'h2', 'li', 'span', 'strong', 'em', 'a')
+
+
+def sentence(rng, words):
+    """
+    Generates one sentence of `words` words ending with punctuation.
+    """
+    text = ' '.join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + rng.choice('..!?')
+
+
+def plain_text(rng, words):
+    """
+    Generates plain text of roughly `words` words, split into sentences.
+
+    Args:
+        rng (random.Random): The random generator.
+        words (int): The approximate number of words.
+
+    Returns:
+        str: The generated text.
+    """
+    sentences = []
+    remaining = words
+    while remaining > 0:
+        length = min(remaining, rng.randint(5, 20))
+        sentences.append(sentence(rng, length))
+        remaining -= length
+    return ' '.join(sentences)
+
+
+def flat_html(rng, paragraphs, words_per_paragraph=30):
+    """
+    Generates an HTML document made of sibling paragraphs.
+
+    Args:
+        rng (random.Random): The random generator.
+        paragraphs (int): The number of paragraphs.
+        words_per_paragraph (int): The approximate number of words per paragraph.
+
+    Returns:
+        str: The generated HTML.
+    """
+    body = ''.join(f'<p>{plain_text(rng, words_per_paragraph)}</p>' for _ in range(paragraphs))
+    return f'<div><h1>{sentence(rng, 5)}</h1>{body}</div>'
+
+
+def nested_html(rng, depth, breadth=2, words_per_node=8):
+    """
+    Generates an HTML document of nested blocks with a text node at every level.
+
+    Args:
+        rng (random.Random): The random generator.
+        depth (int): The nesting depth.
+        breadth (int): The number of child blocks per block.
+        words_per_node (int): The approximate number of words per text node.
+
+    Returns:
+        str: The generated HTML.
+    """
+    def block(level):
+        tag = rng.choice(BLOCK_TAGS)
+        text_tag = rng.choice(TEXT_TAGS)
+        children = ''.join(block(level + 1) for _ in range(breadth)) if level < depth else ''
+        return f'<{tag} class="level-{level}"><{text_tag}>{plain_text(rng, words_per_node)}</{text_tag}>{children}</{tag}>'
+    return block(1)
+
+
+def translate_payload(rng, content_type):
+    """
+    Generates a /api/translate/ request body with a realistic size distribution:
+    mostly short texts, some medium documents and a few long ones.
+
+    Args:
+        rng (random.Random): The random generator.
+        content_type (str): 'plain' or 'html'.
+
+    Returns:
+        dict: The request body.
+    """
+    size = rng.random()
+    if content_type == 'html':
+        if size < 0.7:
+            original_text = flat_html(rng, rng.randint(1, 4))
+        elif size < 0.95:
+            original_text = flat_html(rng, rng.randint(5, 30))
+        else:
+            original_text = nested_html(rng, depth=rng.randint(3, 6))
+    else:
+        if size < 0.7:
+            original_text = plain_text(rng, rng.randint(3, 60))
+        elif size < 0.95:
+            original_text = plain_text(rng, rng.randint(60, 600))
+        else:
+            original_text = plain_text(rng, rng.randint(600, 3000))
+    return {
+        'original_text': original_text,
+        'content_type': content_type,
+        'dest_language': rng.choice(('EN-US', 'EN-GB', 'FR', 'ES')),
+    }
+
+
+def make_rng(seed=None):
+    """
+    Returns a random generator, seeded for reproducible workloads if a seed is given.
+    """
+    return random.Random(seed)